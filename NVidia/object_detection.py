@@ -28,8 +28,21 @@ class ObjectDetector(object):
                                   output_names=[TRT_OUTPUT_NAME, TRT_OUTPUT_NAME + '_1'])
         self.preprocess_fn = preprocess_fn
         
+    @property
+    def max_batch_size(self):
+        return self.trt_model.engine.max_batch_size
+
+    def infer(self, x):
+        """Runs the engine on input already converted by preprocess_fn."""
+        trt_outputs = self.trt_model(x)
+        return parse_boxes(trt_outputs)
+
     def execute(self, *inputs):
-        trt_outputs = self.trt_model(self.preprocess_fn(*inputs))
+        return self.infer(self.preprocess_fn(*inputs))
+
+    def execute_batch(self, images):
+        batch = np.concatenate([self.preprocess_fn(image) for image in images])
+        trt_outputs = self.trt_model(batch)
         return parse_boxes(trt_outputs)
     
     def __call__(self, *inputs):
@@ -0,0 +1,96 @@
+"""
+Command success rate and time-to-response under simulated packet loss.
+
+A LoopbackTello drops commands and replies at each loss rate, adds a link delay
+and "flies" movement commands for --movement-delay seconds. For every loss rate
+idempotent commands ('command', 'battery?') and movement commands ('cw 1') are
+sent through Tello.send_command with the adaptive timeouts and retransmission,
+then again with --fixed for the original fixed timeouts and a single send.
+Movement commands the responder received more than once are counted as
+duplicates; there must never be any.
+
+Run from the repo root:
+    python -m benchmarks.command_loss
+    python -m benchmarks.command_loss --loss 0 0.1 0.3 --commands 100 --json results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from tello import Tello, Short_Command_Timeout, Long_Command_Timeout, command_class
+from benchmarks.common import latency_summary
+from benchmarks.loopback import LoopbackTello
+
+
+def run_commands(tello, responder, commands, fixed):
+    results = {}
+    for command in commands:
+        timeout, retransmits = None, None
+        if fixed:
+            timeout = Short_Command_Timeout if command_class(command) in ('control', 'query') else Long_Command_Timeout
+            retransmits = 0
+        entry = results.setdefault(command, dict(sent=0, succeeded=0, duplicates=0, times=[]))
+        received_before = sum(1 for _, c in responder.commands if c == command)
+        with contextlib.redirect_stdout(io.StringIO()): # send_command prints every command
+            start = time.monotonic()
+            ok = tello.send_command(command, timeout, retransmits)
+            elapsed = time.monotonic() - start
+        entry['sent'] += 1
+        if ok:
+            entry['succeeded'] += 1
+            entry['times'].append(elapsed)
+        entry['duplicates'] += max(0, sum(1 for _, c in responder.commands if c == command) - received_before - 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loss', type=float, nargs='*', default=[0.0, 0.05, 0.1, 0.2, 0.3],
+                        help='loss rates applied to commands and to replies')
+    parser.add_argument('--commands', type=int, default=50, help='sends of each idempotent command per loss rate')
+    parser.add_argument('--movements', type=int, default=10, help='sends of the movement command per loss rate')
+    parser.add_argument('--delay', type=float, default=0.02, help='one-way link delay in seconds')
+    parser.add_argument('--movement-delay', type=float, default=0.5, help='seconds to fly a movement')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    responder = LoopbackTello(tello_ip='127.0.0.2', local_ip='127.0.0.1', delay=args.delay,
+                              movement_delay=args.movement_delay, seed=0)
+    tello = Tello.instance(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+    commands = ['command', 'battery?'] * args.commands + ['cw 1'] * args.movements
+
+    report = []
+    try:
+        for loss in args.loss:
+            for fixed in (True, False):
+                responder.loss = responder.reply_loss = loss
+                results = run_commands(tello, responder, commands, fixed)
+                for command, entry in results.items():
+                    row = dict(loss=loss, mode='fixed' if fixed else 'adaptive', command=command,
+                               success_rate=entry['succeeded'] / entry['sent'], duplicates=entry['duplicates'],
+                               response_ms=latency_summary(entry['times']) if entry['times'] else None)
+                    report.append(row)
+                    print('loss %4.0f%%  %-8s  %-9s  success %5.1f%%  p50 %7s ms  p95 %7s ms  duplicates %d' % (
+                        100 * loss, row['mode'], command, 100 * row['success_rate'],
+                        '%.1f' % row['response_ms']['p50'] if row['response_ms'] else '-',
+                        '%.1f' % row['response_ms']['p95'] if row['response_ms'] else '-',
+                        row['duplicates']))
+    finally:
+        responder.close()
+
+    stats = tello.command_stats()
+    for kind, entry in sorted(stats.items()):
+        print('%-8s srtt %s ms  timeout %.0f ms  retransmits %d' % (
+            kind, '%.1f' % entry['srtt_ms'] if entry['srtt_ms'] is not None else '-', entry['timeout_ms'],
+            entry['retransmits']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(results=report, command_stats=stats), f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
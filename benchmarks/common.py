@@ -0,0 +1,101 @@
+import glob
+import os
+import time
+import numpy as np
+import cv2
+
+
+RepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TestImages = [os.path.join(RepoDir, 'test_image.jpg'), os.path.join(RepoDir, 'test_image2.jpg')]
+
+
+def latency_summary(samples):
+    """
+    Summarises a list of durations in seconds.
+
+    Returns:
+        dict: count, mean, p50, p90, p99 and max in milliseconds
+    """
+    ms = np.array(samples, dtype=np.float64) * 1000.0
+    if not len(ms):
+        return dict(count=0)
+    return dict(count=int(len(ms)),
+                mean=float(np.mean(ms)),
+                p50=float(np.percentile(ms, 50)),
+                p90=float(np.percentile(ms, 90)),
+                p99=float(np.percentile(ms, 99)),
+                max=float(np.max(ms)))
+
+
+def time_calls(fn, args_list, repeat=1, warmup=2):
+    """
+    Times fn(*args) for every entry of args_list, repeat times over.
+
+    Returns:
+        list: Duration of each call in seconds
+    """
+    for args in args_list[:warmup]:
+        fn(*args)
+
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def load_frames(paths=None, video=None, every=1, limit=None):
+    """
+    Loads BGR frames from image files, directories of images and/or a recorded video.
+
+    Parameters:
+        paths (list): Image files or directories, defaults to the repo test images
+        video (str): Recorded video file, e.g. a capture of the Tello stream
+        every (int): Keep every n-th video frame
+        limit (int): Maximum number of video frames to keep
+
+    Returns:
+        list: (name, frame) tuples
+    """
+    frames = []
+    for path in (paths if paths is not None else TestImages):
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, '*.jpg')) + glob.glob(os.path.join(path, '*.png')))
+        else:
+            files = [path]
+        for name in files:
+            frame = cv2.imread(name)
+            if frame is None:
+                raise RuntimeError('Could not read image ' + name)
+            frames.append((os.path.basename(name), frame))
+
+    if video is not None:
+        cap = cv2.VideoCapture(video)
+        index = 0
+        kept = 0
+        while limit is None or kept < limit:
+            re, frame = cap.read()
+            if not re:
+                break
+            if index % every == 0:
+                frames.append(('%s#%d' % (os.path.basename(video), index), frame))
+                kept += 1
+            index += 1
+        cap.release()
+
+    return frames
+
+
+def resize_for_ssd(frame):
+    return cv2.resize(frame, (300, 300), 0, 0, interpolation=cv2.INTER_AREA)
+
+
+def iou(a, b):
+    """Intersection over union of two normalised [x0, y0, x1, y1] boxes."""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
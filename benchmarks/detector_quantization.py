@@ -0,0 +1,121 @@
+"""
+Compares quantized CPU detector variants against the FP32 reference.
+
+Run from the repo root:
+    python -m benchmarks.detector_quantization --precision int8 fp16 --video recorded_flight.mp4
+
+For each precision it reports per-image latency percentiles, throughput and how
+well the detections agree with FP32 (label match at IoU >= --iou).
+"""
+import argparse
+import json
+import time
+
+from cpu_object_detection import CPUObjectDetector, DefaultModelPath
+from benchmarks.common import latency_summary, time_calls, load_frames, resize_for_ssd, iou
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily pairs candidate detections with reference detections of the same label.
+
+    Returns:
+        list: IoU of each matched pair
+    """
+    unmatched = list(candidate)
+    ious = []
+    for ref in sorted(reference, key=lambda d: -d['confidence']):
+        best, best_iou = None, iou_threshold
+        for det in unmatched:
+            if det['label'] != ref['label']:
+                continue
+            overlap = iou(ref['bbox'], det['bbox'])
+            if overlap >= best_iou:
+                best, best_iou = det, overlap
+        if best is not None:
+            unmatched.remove(best)
+            ious.append(best_iou)
+    return ious
+
+
+def agreement(reference_results, candidate_results, iou_threshold=0.5):
+    """
+    Detection agreement of a candidate model with the reference over a set of images.
+
+    Returns:
+        dict: precision, recall and mean IoU of the matched detections
+    """
+    matched = 0
+    ious = []
+    ref_count = 0
+    cand_count = 0
+    for reference, candidate in zip(reference_results, candidate_results):
+        pairs = match_detections(reference, candidate, iou_threshold)
+        matched += len(pairs)
+        ious += pairs
+        ref_count += len(reference)
+        cand_count += len(candidate)
+
+    return dict(reference_detections=ref_count,
+                detections=cand_count,
+                precision=matched / cand_count if cand_count else 1.0,
+                recall=matched / ref_count if ref_count else 1.0,
+                mean_iou=sum(ious) / len(ious) if ious else None)
+
+
+def benchmark(detector, images, repeat):
+    samples = time_calls(detector, [(image,) for image in images], repeat=repeat)
+    results = [detector(image)[0] for image in images]
+    return dict(latency_ms=latency_summary(samples),
+                throughput_fps=len(samples) / sum(samples)), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DefaultModelPath, help='FP32 ONNX model')
+    parser.add_argument('--precision', nargs='+', default=['int8'], choices=['fp16', 'int8'])
+    parser.add_argument('--images', nargs='*', default=None, help='images or directories (default: test images)')
+    parser.add_argument('--video', default=None, help='recorded video to sample frames from')
+    parser.add_argument('--every', type=int, default=10, help='use every n-th video frame')
+    parser.add_argument('--limit', type=int, default=100, help='maximum number of video frames')
+    parser.add_argument('--repeat', type=int, default=10, help='timed passes over the image set')
+    parser.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU needed for a detection to agree')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.images, args.video, args.every, args.limit)
+    images = [resize_for_ssd(frame) for name, frame in frames]
+    print('%d images' % len(images))
+
+    report = dict(images=len(images), timestamp=time.time(), results={})
+
+    reference = CPUObjectDetector(args.model, 'fp32', num_threads=args.threads)
+    report['results']['fp32'], reference_results = benchmark(reference, images, args.repeat)
+
+    for precision in args.precision:
+        detector = CPUObjectDetector(args.model, precision, num_threads=args.threads)
+        result, results = benchmark(detector, images, args.repeat)
+        result['agreement'] = agreement(reference_results, results, args.iou)
+        report['results'][precision] = result
+
+    for precision, result in report['results'].items():
+        latency = result['latency_ms']
+        line = '%-5s p50 %7.2f ms  p90 %7.2f ms  p99 %7.2f ms  %6.1f fps' % (
+            precision, latency['p50'], latency['p90'], latency['p99'], result['throughput_fps'])
+        if 'agreement' in result:
+            agree = result['agreement']
+            line += '  precision %.3f  recall %.3f  mean IoU %s' % (
+                agree['precision'], agree['recall'],
+                '%.3f' % agree['mean_iou'] if agree['mean_iou'] is not None else '-')
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
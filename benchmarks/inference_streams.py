@@ -0,0 +1,111 @@
+"""
+Measures what the InferenceService batching gains as more video streams share one detector.
+
+For each stream count, that many producer threads submit frames through one
+InferenceService backed by the CPU detector, each paced at --fps like a drone
+video stream (--fps 0 submits as fast as results come back). Every count is
+run twice: with batching (--batch) and with max_batch_size 1, so the report
+gives the throughput gain of batching and the queueing delay it costs per
+stream count.
+
+Run from the repo root:
+    python -m benchmarks.inference_streams --model ssd_mobilenet_v2_coco.onnx
+    python -m benchmarks.inference_streams --streams 1 2 4 8 --fps 0 --batch 8 --json results.json
+"""
+import argparse
+import json
+import threading
+import time
+
+from cpu_object_detection import CPUObjectDetector, DefaultModelPath
+from inference_service import InferenceService
+from benchmarks.common import latency_summary, load_frames, resize_for_ssd
+
+
+def produce(service, images, stream_id, fps, end, latencies):
+    """Submits images round-robin until end, waiting for each result, at fps frames per second."""
+    period = 1.0 / fps if fps > 0 else 0.0
+    next_time = time.monotonic()
+    index = 0
+    while time.monotonic() < end:
+        start = time.monotonic()
+        service.submit(images[index % len(images)], stream_id).wait(timeout=10.0)
+        latencies.append(time.monotonic() - start)
+        index += 1
+        if period:
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic() # fell behind, like a camera dropping frames
+
+
+def run_streams(service, images, streams, fps, duration):
+    """
+    Returns:
+        dict: InferenceService.stats() for the run plus the producers' frame latency_ms
+    """
+    service.reset_stats()
+    latencies = [[] for _ in range(streams)]
+    end = time.monotonic() + duration
+    producers = [threading.Thread(target=produce, args=(service, images, stream, fps, end, latencies[stream]),
+                                  name='producer-%d' % stream)
+                 for stream in range(streams)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    result = service.stats()
+    result['latency_ms'] = latency_summary([sample for samples in latencies for sample in samples])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=DefaultModelPath, help='FP32 ONNX model')
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'fp16', 'int8'])
+    parser.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    parser.add_argument('--images', nargs='*', default=None, help='images or directories (default: test images)')
+    parser.add_argument('--video', default=None, help='recorded video to sample frames from')
+    parser.add_argument('--streams', type=int, nargs='*', default=[1, 2, 4, 8], help='producer counts')
+    parser.add_argument('--fps', type=float, default=30.0, help='frames per second per stream, 0 for closed loop')
+    parser.add_argument('--batch', type=int, default=4, help='InferenceService.max_batch_size when batching')
+    parser.add_argument('--max-latency', type=float, default=0.010, help='InferenceService.max_latency in seconds')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    images = [resize_for_ssd(frame) for name, frame in load_frames(args.images, args.video, limit=100)]
+    detector = CPUObjectDetector(args.model, args.precision, num_threads=args.threads)
+    service = InferenceService.instance(model=detector)
+    service.max_latency = args.max_latency
+
+    print('%7s %12s %12s %8s %10s %16s %16s' % ('streams', 'single fps', 'batched fps', 'gain', 'mean batch',
+                                                'queue p50/p95 ms', 'frame p50/p95 ms'))
+    report = dict(timestamp=time.time(), fps=args.fps, batch=args.batch, max_latency=args.max_latency, results={})
+    try:
+        for streams in args.streams:
+            service.max_batch_size = 1
+            single = run_streams(service, images, streams, args.fps, args.duration)
+            service.max_batch_size = args.batch
+            batched = run_streams(service, images, streams, args.fps, args.duration)
+
+            gain = batched['throughput_fps'] / single['throughput_fps'] if single['throughput_fps'] else None
+            report['results'][streams] = dict(single=single, batched=batched, throughput_gain=gain)
+            queue = batched['queue_delay_ms'] or dict(p50=0.0, p95=0.0)
+            print('%7d %12.1f %12.1f %8s %10.2f %7.1f/%-8.1f %7.1f/%-8.1f' % (
+                streams, single['throughput_fps'], batched['throughput_fps'],
+                '%.2fx' % gain if gain is not None else '-', batched['mean_batch_size'],
+                queue['p50'], queue['p95'], batched['latency_ms'].get('p50', 0.0), batched['latency_ms'].get('p95', 0.0)))
+    finally:
+        service.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
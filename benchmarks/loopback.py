@@ -0,0 +1,210 @@
+"""
+Loopback stand-ins for the drone, so the command, status and video paths can be
+exercised on any Linux box.
+
+The Tello class binds the command port on local_ip and sends to tello_ip on the
+same port, so the two ends need different loopback addresses:
+    responder = LoopbackTello(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+    tello = Tello.instance(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+"""
+import random
+import socket
+import subprocess
+import threading
+import time
+
+from tello import TelloCmdPort, TelloStatusPort
+
+
+StatusTemplate = ('mid:-1;x:0;y:0;z:0;mpry:0,0,0;pitch:%d;roll:%d;yaw:%d;vgx:0;vgy:0;vgz:0;'
+                  'templ:60;temph:63;tof:%d;h:%d;bat:87;baro:123.45;time:%d;agx:0.00;agy:0.00;agz:-1000.00;\r\n')
+
+QueryResponses = {'battery?': '87', 'speed?': '100.0', 'time?': '0s', 'height?': '0dm',
+                  'temp?': '60~63C', 'attitude?': 'pitch:0;roll:0;yaw:0;', 'baro?': '123.45',
+                  'tof?': '100mm', 'wifi?': '90', 'sdk?': '30', 'sn?': '0TQZH000000000'}
+
+
+class LoopbackTello(object):
+    """
+    UDP responder that answers Tello SDK commands and sends status packets.
+
+    Public Attributes:
+        loss (float): Probability that a command datagram is dropped before it is answered
+        reply_loss (float): Probability that a reply is dropped after the command was executed
+        delay (float): Seconds before each reply, added to movement_delay for movement commands
+        movement_delay (float): Extra seconds to "fly" a movement command
+        commands (list): (time, command) of every command that was received (not dropped)
+        on_command (callable): Called with each received command string
+    """
+
+    MovementCommands = ('takeoff', 'land', 'up', 'down', 'left', 'right', 'forward', 'back',
+                        'cw', 'ccw', 'go', 'curve', 'flip')
+
+    def __init__(self, tello_ip='127.0.0.2', local_ip='127.0.0.1', status_rate=10.0,
+                 loss=0.0, reply_loss=0.0, delay=0.0, movement_delay=0.0, seed=None):
+        self.loss = loss
+        self.reply_loss = reply_loss
+        self.delay = delay
+        self.movement_delay = movement_delay
+        self.status_rate = status_rate
+        self.commands = []
+        self.on_command = None
+        self.yaw = 0
+
+        self._local_ip = local_ip
+        self._random = random.Random(seed)
+        self._running = True
+
+        self._cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._cmd_socket.bind((tello_ip, TelloCmdPort))
+        self._cmd_socket.settimeout(0.2)
+        self._status_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self._threads = [threading.Thread(target=self._serve_commands), threading.Thread(target=self._send_status)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._cmd_socket.close()
+        self._status_socket.close()
+
+    def response_for(self, command):
+        if command in QueryResponses:
+            return QueryResponses[command]
+        return 'ok'
+
+    def _reply(self, command, address):
+        name = command.split(' ')[0]
+        delay = self.delay + (self.movement_delay if name in self.MovementCommands else 0.0)
+        if delay:
+            time.sleep(delay)
+        if self._random.random() >= self.reply_loss:
+            self._cmd_socket.sendto(self.response_for(command).encode('utf-8'), address)
+
+    def _serve_commands(self):
+        while self._running:
+            try:
+                data, address = self._cmd_socket.recvfrom(1518)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self._random.random() < self.loss:
+                continue
+            command = data.decode('utf-8').strip()
+            self.commands.append((time.monotonic(), command))
+            if self.on_command is not None:
+                self.on_command(command)
+            if command.startswith('rc '):
+                continue # rc is never answered
+            if command.startswith('cw '):
+                self.yaw = (self.yaw + int(command.split()[1]) + 180) % 360 - 180
+            elif command.startswith('ccw '):
+                self.yaw = (self.yaw - int(command.split()[1]) + 180) % 360 - 180
+            # answer on a separate thread so a long movement does not block status/queries
+            reply = threading.Thread(target=self._reply, args=(command, address))
+            reply.daemon = True
+            reply.start()
+
+    def _send_status(self):
+        start = time.monotonic()
+        while self._running:
+            elapsed = time.monotonic() - start
+            status = StatusTemplate % (0, 0, self.yaw, 10, 0, int(elapsed))
+            try:
+                self._status_socket.sendto(status.encode('utf-8'), (self._local_ip, TelloStatusPort))
+            except OSError:
+                break
+            time.sleep(1.0 / self.status_rate)
+
+
+class LossyUDPRelay(object):
+    """
+    Forwards UDP datagrams from listen_port to target_port, dropping a fraction of them.
+
+    Put it between a video source and StreamCamera to inject packet loss:
+        relay = LossyUDPRelay(11112, 11111, loss=0.05)
+        source = start_video_source('recorded.h264', 11112)
+    """
+
+    def __init__(self, listen_port, target_port, loss=0.0, host='127.0.0.1', seed=None):
+        self.loss = loss
+        self.forwarded = 0
+        self.dropped = 0
+
+        self._target = (host, target_port)
+        self._random = random.Random(seed)
+        self._running = True
+        self._in = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._in.bind((host, listen_port))
+        self._in.settimeout(0.2)
+        self._out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._thread = threading.Thread(target=self._relay)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._in.close()
+        self._out.close()
+
+    def _relay(self):
+        while self._running:
+            try:
+                data, address = self._in.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self._random.random() < self.loss:
+                self.dropped += 1
+            else:
+                self._out.sendto(data, self._target)
+                self.forwarded += 1
+
+
+def start_video_source(path, port, host='127.0.0.1', loop=True, fps=None):
+    """
+    Streams a recorded video to udp://host:port in real time as raw H.264, like the Tello does.
+
+    Parameters:
+        fps (float): Resample to this frame rate, like the Tello after setfps. Default: as recorded
+
+    Returns:
+        subprocess.Popen: The ffmpeg process, terminate() it when done
+    """
+    command = ['ffmpeg', '-loglevel', 'error', '-re']
+    if loop:
+        command += ['-stream_loop', '-1']
+    command += ['-i', path, '-an']
+    if fps is not None:
+        command += ['-vf', 'fps=%g' % fps]
+    command += ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+                '-f', 'h264', 'udp://%s:%d?pkt_size=1460' % (host, port)]
+    return subprocess.Popen(command, stdin=subprocess.DEVNULL)
+
+
+def encode_h264(frames, path, fps=30):
+    """
+    Writes BGR frames to path as a raw H.264 elementary stream, encoded like start_video_source().
+
+    Returns:
+        str: path
+    """
+    height, width = frames[0].shape[:2]
+    command = ['ffmpeg', '-loglevel', 'error', '-y',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '%dx%d' % (width, height), '-r', '%g' % fps, '-i', '-',
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-pix_fmt', 'yuv420p',
+               '-f', 'h264', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    for frame in frames:
+        process.stdin.write(frame.tobytes())
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError('ffmpeg could not encode ' + path)
+    return path
@@ -0,0 +1,94 @@
+"""
+Load test for the headless service MJPEG endpoint.
+
+Start tello_service.py, then run from the repo root:
+    python -m benchmarks.mjpeg_load --viewers 1 2 4 8 --duration 10
+
+Each step opens that many concurrent viewers and reports the frame rate every
+viewer actually received, so a drop with more viewers shows up directly.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+from benchmarks.common import latency_summary
+
+
+def watch(url, duration, result):
+    """Reads MJPEG parts from url for duration seconds, recording the arrival time of each frame."""
+    parts = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+    connection.request('GET', parts.path)
+    response = connection.getresponse()
+
+    arrivals = []
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            length = None
+            while True: # part headers
+                line = response.fp.readline()
+                if not line:
+                    raise ConnectionError('stream ended')
+                line = line.strip()
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+                elif not line and length is not None:
+                    break
+            response.fp.read(length)
+            arrivals.append(time.monotonic())
+    except (ConnectionError, OSError) as msg:
+        result['error'] = repr(msg)
+    finally:
+        connection.close()
+
+    result['frames'] = len(arrivals)
+    result['fps'] = (len(arrivals) - 1) / (arrivals[-1] - arrivals[0]) if len(arrivals) > 1 else 0.0
+    result['interval_ms'] = latency_summary([b - a for a, b in zip(arrivals, arrivals[1:])])
+
+
+def run_step(url, viewers, duration):
+    results = [dict() for _ in range(viewers)]
+    threads = [threading.Thread(target=watch, args=(url, duration, result)) for result in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rates = [result['fps'] for result in results]
+    return dict(viewers=viewers,
+                min_fps=min(rates),
+                mean_fps=sum(rates) / len(rates),
+                total_fps=sum(rates),
+                errors=[result['error'] for result in results if 'error' in result],
+                per_viewer=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080/video.mjpg')
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per step')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    report = []
+    for viewers in args.viewers:
+        step = run_step(args.url, viewers, args.duration)
+        report.append(step)
+        print('%2d viewers: min %5.1f fps  mean %5.1f fps  total %6.1f fps%s' % (
+            viewers, step['min_fps'], step['mean_fps'], step['total_fps'],
+            '  errors: %d' % len(step['errors']) if step['errors'] else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
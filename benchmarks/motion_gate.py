@@ -0,0 +1,114 @@
+"""
+Measures the detector compute the MLProcess motion gate saves on hover footage.
+
+Every frame of a recorded video (ideally the drone hovering or sitting on the
+ground) is passed through MotionGate at each threshold, at the Tello frame
+rate. The report gives the fraction of detector runs skipped and the gate's
+own cost per frame. With --model the CPU detector also runs on every frame,
+so the saved detector time is measured and the reused detections are
+compared with fresh ones (recall/precision at IoU 0.5).
+
+Without --video a synthetic hover clip is used: the test image with a few
+pixels of drift and sensor noise per frame.
+
+Run from the repo root:
+    python -m benchmarks.motion_gate --video hover.mp4
+    python -m benchmarks.motion_gate --video hover.mp4 --model ssd_mobilenet_v2_coco.onnx --thresholds 2 4 8
+"""
+import argparse
+import json
+import os
+import numpy as np
+import cv2
+
+from motion_gate import MotionGate
+from benchmarks.common import RepoDir, TestImages, latency_summary, time_calls, load_frames, resize_for_ssd
+from benchmarks.detector_quantization import agreement
+
+
+def synthetic_hover(count=300, seed=0):
+    """Test image with a slow random drift of a few pixels and sensor noise, like a hovering drone."""
+    rng = np.random.RandomState(seed)
+    base = cv2.resize(cv2.imread(TestImages[0]), (340, 340))
+    drift = np.cumsum(rng.normal(0, 0.3, size=(count, 2)), axis=0).clip(-20, 20)
+    frames = []
+    for dx, dy in drift:
+        x, y = int(round(20 + dx)), int(round(20 + dy))
+        frame = base[y:y + 300, x:x + 300].astype(np.int16) + rng.normal(0, 2.0, size=(300, 300, 3)).astype(np.int16)
+        frames.append(frame.clip(0, 255).astype(np.uint8))
+    return frames
+
+
+def gate_decisions(images, threshold, refresh, fps):
+    gate = MotionGate()
+    decisions = [gate.should_run(image, index / fps, threshold, refresh) for index, image in enumerate(images)]
+    return decisions, gate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None, help='recorded hover footage')
+    parser.add_argument('--limit', type=int, default=900, help='maximum number of video frames')
+    parser.add_argument('--fps', type=float, default=30.0, help='frame rate the footage was recorded at')
+    parser.add_argument('--thresholds', type=float, nargs='*', default=[2.0, 4.0, 8.0], help='MotionGate thresholds')
+    parser.add_argument('--refresh', type=float, default=1.0, help='forced refresh interval in seconds')
+    parser.add_argument('--model', default=None, help='ONNX model to measure detector time and accuracy')
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'fp16', 'int8'])
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    if args.video:
+        images = [resize_for_ssd(frame) for _, frame in load_frames(paths=[], video=args.video, limit=args.limit)]
+    else:
+        images = synthetic_hover()
+    if not images:
+        raise RuntimeError('No frames to process')
+
+    probe = MotionGate()
+    probe.should_run(images[0], 0.0, 0.0, 0.0) # take a reference, so score() includes the comparison
+    gate_ms = latency_summary(time_calls(probe.score, [(image,) for image in images[:100]]))
+
+    detector_ms = None
+    fresh = None
+    if args.model:
+        from cpu_object_detection import CPUObjectDetector
+        detector = CPUObjectDetector(args.model if os.path.isabs(args.model) else os.path.join(RepoDir, args.model),
+                                     args.precision)
+        samples = time_calls(detector, [(image,) for image in images[:20]])
+        detector_ms = latency_summary(samples)['mean']
+        fresh = [detector(image)[0] for image in images]
+
+    print('%d frames, gate %.3f ms/frame%s' % (len(images), gate_ms['mean'],
+          ', detector %.1f ms/frame' % detector_ms if detector_ms is not None else ''))
+
+    results = dict(frames=len(images), gate_ms=gate_ms, detector_ms=detector_ms, thresholds={})
+    for threshold in args.thresholds:
+        decisions, gate = gate_decisions(images, threshold, args.refresh, args.fps)
+        result = gate.stats()
+        result['gate_ms_total'] = gate_ms['mean'] * len(images)
+        line = 'threshold %5.1f  executed %5d  skipped %5d (%5.1f%%)' % (
+            threshold, result['executed'], result['skipped'], 100 * result['skip_ratio'])
+
+        if fresh is not None:
+            # what MLProcess would have published: the detections of the last executed frame
+            reused, last = [], None
+            for run, detections in zip(decisions, fresh):
+                if run:
+                    last = detections
+                reused.append(last)
+            result['saved_ms'] = result['skipped'] * detector_ms - result['gate_ms_total']
+            result['agreement'] = agreement(fresh, reused)
+            line += '  saved %6.0f ms (%4.1f%% of detector time)  recall %.3f precision %.3f' % (
+                result['saved_ms'], 100 * result['saved_ms'] / (detector_ms * len(images)),
+                result['agreement']['recall'], result['agreement']['precision'])
+        print(line)
+        results['thresholds'][threshold] = result
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
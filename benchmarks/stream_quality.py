@@ -0,0 +1,110 @@
+"""
+Exercises the StreamQualityController against a loopback stream with injected loss.
+
+A recorded video is streamed through a LossyUDPRelay into StreamCamera. A
+LoopbackTello answers the setbitrate/setresolution/setfps commands, setfps
+restarts the source at the new frame rate, and the relay
+drops packets as if the link had limited capacity: whatever the selected bitrate
+exceeds the capacity of the current phase is lost, plus a base loss.
+
+Run from the repo root (needs ffmpeg):
+    python -m benchmarks.stream_quality --video recorded.mp4
+    python -m benchmarks.stream_quality --video recorded.mp4 --fixed 5   # manual override for comparison
+"""
+import argparse
+import json
+import time
+
+from tello import Tello
+from stream_camera import StreamCamera
+from stream_quality import StreamQualityController, QualityLevels, FpsValues
+from benchmarks.loopback import LoopbackTello, LossyUDPRelay, start_video_source
+
+
+# (seconds, link capacity in Mbps, base loss)
+DefaultPhases = [(20.0, 6.0, 0.0), (30.0, 1.5, 0.02), (40.0, 6.0, 0.0)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', required=True, help='recorded video to stream')
+    parser.add_argument('--phases', default=None, help='JSON list of [seconds, capacity_mbps, base_loss]')
+    parser.add_argument('--fixed', type=int, default=None, help='pin this quality level instead of adapting')
+    parser.add_argument('--interval', type=float, default=2.0, help='controller interval in seconds')
+    parser.add_argument('--json', default=None, help='write the timeline to this file')
+    args = parser.parse_args(argv)
+
+    phases = json.loads(args.phases) if args.phases else DefaultPhases
+    link = dict(capacity=phases[0][1], base_loss=phases[0][2], bitrate=QualityLevels[-1][0])
+
+    relay = LossyUDPRelay(11112, 11111)
+
+    def update_loss():
+        overload = max(0.0, 1.0 - link['capacity'] / link['bitrate']) if link['bitrate'] else 0.0
+        relay.loss = min(1.0, link['base_loss'] + overload)
+
+    def on_command(command):
+        if command.startswith('setbitrate '):
+            link['bitrate'] = int(command.split()[1])
+            update_loss()
+        elif command.startswith('setfps '):
+            fps = FpsValues[command.split()[1]]
+            if fps != link['fps']:
+                link['fps'] = fps
+                link['source'].terminate()
+                link['source'] = start_video_source(args.video, 11112, fps=fps)
+
+    responder = LoopbackTello(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+    link['fps'] = FpsValues[QualityLevels[-1][2]]
+    link['source'] = start_video_source(args.video, 11112, fps=link['fps'])
+    responder.on_command = on_command
+
+    tello = Tello.instance(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+    tello.command()
+    tello.streamon()
+    camera = StreamCamera.instance(stream_url='udp://127.0.0.1:11111?overrun_nonfatal=1')
+    camera.start()
+
+    controller = StreamQualityController.instance(tello=tello, camera=camera, interval=args.interval)
+    controller.start()
+    if args.fixed is not None:
+        controller.set_override(args.fixed)
+
+    timeline = []
+    start = time.monotonic()
+    try:
+        for seconds, capacity, base_loss in phases:
+            link['capacity'], link['base_loss'] = capacity, base_loss
+            update_loss()
+            phase_end = time.monotonic() + seconds
+            while time.monotonic() < phase_end:
+                time.sleep(args.interval)
+                health = camera.health()
+                sample = dict(t=time.monotonic() - start, capacity=capacity, level=controller.level,
+                              bitrate=link['bitrate'], injected_loss=relay.loss, measured_loss=health['loss'],
+                              delay_ms=health['delay_ms'], fps=health['fps'])
+                timeline.append(sample)
+                print('%6.1fs capacity %4.1f  level %d (%d Mbps, %.0f fps)  injected %5.1f%%  measured %5.1f%%  delay %s ms' % (
+                    sample['t'], capacity, sample['level'], sample['bitrate'], sample['fps'], 100 * sample['injected_loss'],
+                    100 * sample['measured_loss'],
+                    '%.0f' % sample['delay_ms'] if sample['delay_ms'] is not None else '-'))
+    finally:
+        controller.stop()
+        camera.stop()
+        link['source'].terminate()
+        relay.close()
+        responder.close()
+
+    in_target = [s for s in timeline if s['delay_ms'] is not None and s['delay_ms'] <= controller.latency_target * 1000.0]
+    print('%d of %d samples within the %.0f ms delay target, %d level changes' % (
+        len(in_target), len(timeline), controller.latency_target * 1000.0, len(controller.history) - 1))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(timeline=timeline, changes=[h[:3] for h in controller.history]), f, indent=2)
+
+    return timeline
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Whole-pipeline benchmark suite.
+
+Measures each stage in isolation on recorded/synthetic inputs with the CPU
+detector path, so it runs on any Linux box:
+    command_rtt    Tello.send_command round trip against a loopback responder
+    status_parse   status packets parsed and added to the telemetry history per second
+    capture        H.264 decode frames per second (synthetic clip encoded with ffmpeg, or --video)
+    preprocess     resize to 300x300 plus the TensorRT detector's input conversion
+                   (also reported for the CPU detector's conversion)
+    detector       CPUObjectDetector latency (skipped without --model)
+    postprocess    target selection and overlay publication in MLProcess
+    draw           overlay drawing on a 300x300 preview
+    encode         JPEG encode of a 300x300 preview and of a full 960x720 frame
+
+Run from the repo root:
+    python -m benchmarks.suite --json results.json                   # measure
+    python -m benchmarks.suite --update-baseline                     # store this box's baseline
+    python -m benchmarks.suite                                       # exits 1 if a stage regressed or there is no baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+import cv2
+
+from benchmarks.common import RepoDir, TestImages, latency_summary, time_calls, resize_for_ssd
+
+
+DefaultBaseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TelloFrameSize = (960, 720)
+
+# same normalisation as NVidia.object_detection, which can't be imported without TensorRT
+SSDMean = 255.0 * np.array([0.5, 0.5, 0.5])
+SSDStdev = 255.0 * np.array([0.5, 0.5, 0.5])
+
+
+def bgr8_to_ssd_input(camera_value):
+    """Copy of NVidia.object_detection.bgr8_to_ssd_input, keep the two in step."""
+    x = camera_value
+    x = cv2.cvtColor(x, cv2.COLOR_BGR2RGB)
+    x = x.transpose((2, 0, 1)).astype(np.float32)
+    x -= SSDMean[:, None, None]
+    x /= SSDStdev[:, None, None]
+    return x[None, ...]
+
+
+def latency_result(samples):
+    """Stage result keyed on the median latency, lower is better."""
+    summary = latency_summary(samples)
+    return dict(metric='p50_ms', value=summary['p50'], higher_is_better=False, latency_ms=summary)
+
+
+def rate_result(count, seconds, unit):
+    """Stage result keyed on a rate, higher is better."""
+    return dict(metric=unit, value=count / seconds, higher_is_better=True)
+
+
+def synthetic_frames(count=60, size=TelloFrameSize):
+    """Test image scaled to the Tello resolution, panned a few pixels per frame like a hovering drone."""
+    base = cv2.resize(cv2.imread(TestImages[0]), (size[0] + count, size[1] + count))
+    return [np.ascontiguousarray(base[i:i + size[1], i:i + size[0]]) for i in range(count)]
+
+
+def synthetic_detections(count=10, seed=0):
+    rng = random.Random(seed)
+    detections = []
+    for _ in range(count):
+        x0, y0 = rng.uniform(0, 0.7), rng.uniform(0, 0.7)
+        detections.append(dict(label=rng.choice([1, 17, 47]), confidence=rng.uniform(0.3, 1.0),
+                               bbox=[x0, y0, x0 + rng.uniform(0.05, 0.3), y0 + rng.uniform(0.05, 0.3)]))
+    return detections
+
+
+def bench_command_rtt(args):
+    from tello import Tello, Short_Command_Timeout
+    from benchmarks.loopback import LoopbackTello
+
+    responder = LoopbackTello(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+    try:
+        tello = Tello.instance(tello_ip='127.0.0.2', local_ip='127.0.0.1')
+        with contextlib.redirect_stdout(io.StringIO()): # send_command prints every command
+            samples = time_calls(lambda: tello.send_command('command', Short_Command_Timeout), [()] * args.commands, warmup=1)
+    finally:
+        responder.close()
+    return latency_result(samples)
+
+
+def bench_status_parse(args):
+    from telemetry import TelemetryFusion
+    from benchmarks.loopback import StatusTemplate
+
+    packets = [StatusTemplate % (i % 10, -i % 7, i % 360 - 180, 100 + i % 50, i % 30, i) for i in range(1000)]
+    fusion = TelemetryFusion()
+    start = time.perf_counter()
+    for i in range(args.status_passes):
+        for j, packet in enumerate(packets):
+            fusion.add(i * len(packets) + j, packet)
+    return rate_result(args.status_passes * len(packets), time.perf_counter() - start, 'packets_per_s')
+
+
+def bench_capture(args, frames):
+    from benchmarks.loopback import encode_h264
+
+    path = args.video
+    temp_dir = None
+    if path is None:
+        # raw H.264 like the Tello sends, decoding it costs far more than MJPG
+        temp_dir = tempfile.TemporaryDirectory()
+        path = encode_h264(frames, os.path.join(temp_dir.name, 'synthetic.h264'))
+
+    try:
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG)
+        count = 0
+        start = time.perf_counter()
+        while cap.grab():
+            re, frame = cap.retrieve()
+            if re:
+                count += 1
+        elapsed = time.perf_counter() - start
+        cap.release()
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    if not count:
+        raise RuntimeError('Could not decode ' + path)
+    return rate_result(count, elapsed, 'fps')
+
+
+def bench_preprocess(args, frames):
+    from cpu_object_detection import bgr8_to_ort_input
+    inputs = [(frame,) for frame in frames]
+    result = latency_result(time_calls(lambda frame: bgr8_to_ssd_input(resize_for_ssd(frame)), inputs, repeat=args.repeat))
+    result['cpu_detector_latency_ms'] = latency_summary(
+        time_calls(lambda frame: bgr8_to_ort_input(resize_for_ssd(frame)), inputs, repeat=args.repeat))
+    return result
+
+
+def bench_detector(args, images):
+    from cpu_object_detection import CPUObjectDetector
+    detector = CPUObjectDetector(args.model, args.precision, num_threads=args.threads)
+    return latency_result(time_calls(detector, [(image,) for image in images[:10]], repeat=max(1, args.repeat // 5)))
+
+
+def bench_postprocess(args):
+    from ml_process import MLProcess
+
+    mlp = MLProcess.instance(model=lambda image: [[]])
+    mlp.target_selection = 1
+    detection_sets = [[synthetic_detections(seed=i)] for i in range(50)] # detector output for one frame
+    now = time.monotonic()
+
+    return latency_result(time_calls(lambda detections: mlp._postprocess(detections, now, None),
+                                     [(d,) for d in detection_sets], repeat=args.repeat))
+
+
+def bench_draw(args, images):
+    from overlay import DetectionOverlay
+
+    overlay = DetectionOverlay()
+    overlay.update(synthetic_detections(), synthetic_detections(3, seed=1), None)
+    return latency_result(time_calls(lambda image: overlay.draw(image.copy()),
+                                     [(image,) for image in images], repeat=args.repeat))
+
+
+def bench_encode(args, frames, images):
+    params = [cv2.IMWRITE_JPEG_QUALITY, 80]
+    preview = latency_summary(time_calls(lambda image: cv2.imencode('.jpg', image, params),
+                                         [(image,) for image in images], repeat=args.repeat))
+    full = latency_summary(time_calls(lambda frame: cv2.imencode('.jpg', frame, params),
+                                      [(frame,) for frame in frames[:20]], repeat=args.repeat))
+    return dict(metric='p50_ms', value=preview['p50'], higher_is_better=False,
+                latency_ms=preview, full_frame_latency_ms=full)
+
+
+def run(args):
+    frames = synthetic_frames()
+    images = [resize_for_ssd(frame) for frame in frames]
+
+    stages = [('command_rtt', lambda: bench_command_rtt(args)),
+              ('status_parse', lambda: bench_status_parse(args)),
+              ('capture', lambda: bench_capture(args, frames)),
+              ('preprocess', lambda: bench_preprocess(args, frames)),
+              ('detector', lambda: bench_detector(args, images)),
+              ('postprocess', lambda: bench_postprocess(args)),
+              ('draw', lambda: bench_draw(args, images)),
+              ('encode', lambda: bench_encode(args, frames, images))]
+
+    results = {}
+    for name, bench in stages:
+        if args.stages and name not in args.stages:
+            continue
+        if name == 'detector' and not (args.model and os.path.exists(args.model)):
+            results[name] = dict(skipped='no CPU model, pass --model')
+            continue
+        results[name] = bench()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list: (stage, value, baseline value, allowed value) for every regressed stage
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if 'value' not in result or not reference or 'value' not in reference:
+            continue
+        allowed_change = reference.get('tolerance', tolerance)
+        if result['higher_is_better']:
+            allowed = reference['value'] * (1.0 - allowed_change)
+            regressed = result['value'] < allowed
+        else:
+            allowed = reference['value'] * (1.0 + allowed_change)
+            regressed = result['value'] > allowed
+        if regressed:
+            regressions.append((name, result['value'], reference['value'], allowed))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='*', default=None, help='only run these stages')
+    parser.add_argument('--video', default=None, help='recorded video for the capture stage')
+    parser.add_argument('--model', default=os.path.join(RepoDir, 'ssd_mobilenet_v2_coco.onnx'), help='ONNX model for the detector stage')
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'fp16', 'int8'])
+    parser.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    parser.add_argument('--repeat', type=int, default=20, help='passes over the inputs for latency stages')
+    parser.add_argument('--commands', type=int, default=10, help='send_command round trips')
+    parser.add_argument('--status-passes', type=int, default=20, help='passes over 1000 status packets')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--baseline', default=DefaultBaseline, help='baseline results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fractional regression per stage')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report = dict(timestamp=time.time(), platform=sys.platform, results=results)
+
+    for name, result in results.items():
+        if 'skipped' in result:
+            print('%-12s skipped: %s' % (name, result['skipped']))
+        else:
+            print('%-12s %10.3f %s' % (name, result['value'], result['metric']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({name: dict(metric=r['metric'], value=r['value']) for name, r in results.items() if 'value' in r},
+                      f, indent=2, sort_keys=True)
+        print('baseline written to ' + args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # a missing baseline must not pass the regression check silently
+        print('no baseline at %s, run with --update-baseline to create one' % args.baseline)
+        return 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, value, reference, allowed in regressions:
+        print('REGRESSION %s: %.3f (baseline %.3f, allowed %.3f)' % (name, value, reference, allowed))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Checks plan_trajectory against a simulated drone and compares it with flying one command per leg.
+
+SimulatedTello flies go/curve/cw/ccw kinematically and rejects anything a real
+Tello would answer with 'error' (out of range, within +-20 cm on every axis,
+curve radius or speed out of range). For each scenario the naive plan (no
+merging, no curves) and the compiled plan are flown, every waypoint is checked
+to lie on the flown path and the command count and flight time are reported.
+
+Run from the repo root:
+    python -m benchmarks.trajectory_plans
+    python -m benchmarks.trajectory_plans --speed 40 --json results.json
+"""
+import argparse
+import json
+import math
+
+from trajectory import (plan_trajectory, arc, Waypoint, Go_Range, Min_Move, Go_Speeds, Curve_Speeds, Curve_Radius,
+                        body_offset, normalize_waypoints)
+
+
+Acceleration = 100.0    # cm/s^2 of the simulated drone
+Settle_Time = 0.5       # seconds to stop and hover after each command
+Response_Time = 0.3     # seconds for the 'ok' to arrive
+Yaw_Rate = 75.0         # degrees/second
+
+
+class SimulatedTello(object):
+    """
+    Kinematic stand-in for Tello with the same movement methods.
+
+    Public Attributes:
+        position (tuple): x, y, z cm in the start frame
+        yaw (float): Degrees clockwise from the start heading
+        flight_time (float): Simulated seconds, trapezoidal speed profile plus settle and response time
+        path (list): Positions flown through, including curve middle points
+        errors (list): Commands that were rejected
+    """
+
+    def __init__(self):
+        self.position = (0.0, 0.0, 0.0)
+        self.yaw = 0.0
+        self.flight_time = 0.0
+        self.path = [self.position]
+        self.commands = []
+        self.errors = []
+
+    def _reject(self, command):
+        self.errors.append(command)
+        return False
+
+    def _move_time(self, distance, speed):
+        ramp = speed / Acceleration # time to reach speed
+        if distance < speed * ramp: # never reaches speed
+            return 2.0 * math.sqrt(distance / Acceleration)
+        return distance / speed + ramp
+
+    def _fly_to(self, offset):
+        x, y, z = body_offset(offset, -self.yaw)
+        self.position = (self.position[0] + x, self.position[1] + y, self.position[2] + z)
+        self.path.append(self.position)
+
+    @staticmethod
+    def _valid(point):
+        return all(abs(c) <= Go_Range for c in point) and any(abs(c) > Min_Move for c in point)
+
+    def go(self, x, y, z, speed):
+        command = 'go %d %d %d %d' % (x, y, z, speed)
+        self.commands.append(command)
+        if not self._valid((x, y, z)) or not Go_Speeds[0] <= speed <= Go_Speeds[1]:
+            return self._reject(command)
+        self.flight_time += self._move_time(math.sqrt(x * x + y * y + z * z), speed) + Settle_Time + Response_Time
+        self._fly_to((x, y, z))
+        return True
+
+    def curve(self, x1, y1, z1, x2, y2, z2, speed):
+        command = 'curve %d %d %d %d %d %d %d' % (x1, y1, z1, x2, y2, z2, speed)
+        self.commands.append(command)
+        shape = arc((0, 0, 0), (x1, y1, z1), (x2, y2, z2))
+        if (shape is None or not self._valid((x1, y1, z1)) or not self._valid((x2, y2, z2)) or
+                not Curve_Radius[0] <= shape[0] <= Curve_Radius[1] or not Curve_Speeds[0] <= speed <= Curve_Speeds[1]):
+            return self._reject(command)
+        self.flight_time += self._move_time(shape[1], speed) + Settle_Time + Response_Time
+        start = self.position
+        self._fly_to((x1, y1, z1))
+        self.position = start
+        self._fly_to((x2, y2, z2))
+        return True
+
+    def cw(self, x):
+        return self._turn('cw', x)
+
+    def ccw(self, x):
+        return self._turn('ccw', -x)
+
+    def _turn(self, name, degrees):
+        command = '%s %d' % (name, abs(degrees))
+        self.commands.append(command)
+        if not 1 <= abs(degrees) <= 360:
+            return self._reject(command)
+        self.flight_time += abs(degrees) / Yaw_Rate + Settle_Time + Response_Time
+        self.yaw = (self.yaw + degrees + 180.0) % 360.0 - 180.0
+        return True
+
+
+def _distance_to_segment(point, start, end):
+    line = [e - s for s, e in zip(start, end)]
+    offset = [p - s for s, p in zip(start, point)]
+    length = sum(c * c for c in line)
+    t = max(0.0, min(1.0, sum(a * b for a, b in zip(offset, line)) / length)) if length else 0.0
+    return math.sqrt(sum((o - t * c) ** 2 for o, c in zip(offset, line)))
+
+
+def path_error(waypoints, path):
+    """Largest distance in cm from a waypoint to the flown path (curves taken as chords through their middle point)."""
+    if len(path) < 2:
+        path = path * 2
+    return max(min(_distance_to_segment((w.x, w.y, w.z), path[k], path[k + 1]) for k in range(len(path) - 1))
+               for w in waypoints)
+
+
+def scenarios():
+    square = []
+    for corner, heading in ((0, 0), (1, 90), (2, 180), (3, -90)):
+        for step in range(1, 5):
+            along = 50 * step
+            x, y = [(along, 0), (200, -along), (200 - along, -200), (0, -200 + along)][corner]
+            square.append(Waypoint(x, y, 0, heading=(heading + 90 if step == 4 else None)))
+    circle = [(150 * math.sin(2 * math.pi * k / 16), 150 - 150 * math.cos(2 * math.pi * k / 16), 0) for k in range(1, 17)]
+    helix = [(100 * math.sin(2 * math.pi * k / 12), 100 - 100 * math.cos(2 * math.pi * k / 12), 10 * k) for k in range(1, 25)]
+    return dict(square_with_turns=square,
+                circle=circle,
+                long_line=[(100 * k, 0, 0) for k in range(1, 13)],
+                fine_zigzag=[(30 * k, 10 if k % 2 else 0, 0) for k in range(1, 11)],
+                helix=helix)
+
+
+def fly(plan, waypoints):
+    drone = SimulatedTello()
+    ok = plan.execute(drone)
+    return dict(commands=plan.command_count, estimated_s=plan.estimated_time, simulated_s=drone.flight_time,
+                ok=ok and not drone.errors, errors=drone.errors, max_error_cm=path_error(waypoints, drone.path),
+                final_yaw=drone.yaw)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--speed', type=float, default=50.0, help='default speed in cm/s')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print('%-18s %15s %15s %15s %8s %8s' % ('scenario', 'naive cmds/s', 'planned cmds/s', 'simulated s', 'error', 'valid'))
+    for name, waypoints in scenarios().items():
+        waypoints = normalize_waypoints(waypoints)
+        naive = fly(plan_trajectory(waypoints, args.speed, merge=False, curves=False), waypoints)
+        planned = fly(plan_trajectory(waypoints, args.speed), waypoints)
+        results[name] = dict(naive=naive, planned=planned)
+        print('%-18s %6d %7.1fs  %6d %7.1fs  %6.1f/%6.1f %6.1fcm %8s' % (
+            name, naive['commands'], naive['estimated_s'], planned['commands'], planned['estimated_s'],
+            naive['simulated_s'], planned['simulated_s'], planned['max_error_cm'],
+            'ok' if planned['ok'] and naive['ok'] else 'ERROR'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
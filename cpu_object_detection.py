@@ -0,0 +1,130 @@
+import onnxruntime as ort
+import numpy as np
+import cv2
+import os
+
+
+# SSD-MobileNet exported from the TF object detection frozen graph, e.g.
+#   python -m tf2onnx.convert --graphdef frozen_inference_graph.pb --opset 11 \
+#       --inputs image_tensor:0 --outputs detection_boxes:0,detection_classes:0,detection_scores:0,num_detections:0 \
+#       --output ssd_mobilenet_v2_coco.onnx
+DefaultModelPath = 'ssd_mobilenet_v2_coco.onnx'
+
+Precisions = ('fp32', 'fp16', 'int8')
+
+
+def bgr8_to_ort_input(camera_value):
+    x = cv2.cvtColor(camera_value, cv2.COLOR_BGR2RGB)
+    return x[None, ...]
+
+
+def quantized_model_path(model_path, precision):
+    """Returns the file name used for the precision variant of model_path."""
+    if precision == 'fp32':
+        return model_path
+    root, ext = os.path.splitext(model_path)
+    return '%s_%s%s' % (root, precision, ext)
+
+
+def quantize_model(model_path, precision, output_path=None):
+    """
+    Writes a reduced precision copy of an FP32 ONNX model.
+
+    Parameters:
+        model_path (str): FP32 ONNX model
+        precision (str): 'int8' (dynamic weight quantization) or 'fp16'
+        output_path (str): Defaults to quantized_model_path(model_path, precision)
+
+    Returns:
+        str: Path of the written model
+    """
+    if output_path is None:
+        output_path = quantized_model_path(model_path, precision)
+
+    if precision == 'int8':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+    elif precision == 'fp16':
+        import onnx
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(model_path), keep_io_types=True)
+        onnx.save(model, output_path)
+    else:
+        raise ValueError('%s is not a supported quantization precision' % precision)
+
+    return output_path
+
+
+class CPUObjectDetector(object):
+    """
+    CPU counterpart of ObjectDetector for ground-station and CI use.
+
+    Runs the SSD-MobileNet ONNX model with onnxruntime at FP32, FP16 or INT8 and
+    returns detections in the same format as the TensorRT ObjectDetector, so it
+    can be passed to MLProcess or the InferenceService as the model.
+    """
+
+    def __init__(self, model_path=DefaultModelPath, precision='fp32', threshold=0.3,
+                 num_threads=None, preprocess_fn=bgr8_to_ort_input):
+        """
+        Parameters:
+            model_path (str): FP32 ONNX model. Quantized variants are created next to it on first use.
+            precision (str): One of 'fp32', 'fp16', 'int8'
+            threshold (float): Minimum confidence of a returned detection
+            num_threads (int): onnxruntime intra-op threads, None for the default
+        """
+        if precision not in Precisions:
+            raise ValueError('%s is not one of %s' % (precision, Precisions))
+
+        path = quantized_model_path(model_path, precision)
+        if not os.path.exists(path):
+            path = quantize_model(model_path, precision, path)
+
+        options = ort.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.precision = precision
+        self.threshold = threshold
+        self.preprocess_fn = preprocess_fn
+
+    def _parse_outputs(self, outputs):
+        """Converts the TF object detection outputs to the jetbot parse_boxes format."""
+        outputs = {name.split(':')[0]: value for name, value in zip(self.output_names, outputs)}
+        boxes = outputs['detection_boxes']
+        classes = outputs['detection_classes']
+        scores = outputs['detection_scores']
+        counts = outputs['num_detections']
+
+        all_detections = []
+        for i in range(boxes.shape[0]):
+            detections = []
+            for j in range(int(counts[i])):
+                if scores[i][j] < self.threshold:
+                    break # scores are sorted, so nothing else passes
+                # TF boxes are ymin, xmin, ymax, xmax
+                ymin, xmin, ymax, xmax = boxes[i][j]
+                detections.append(dict(label=int(classes[i][j]),
+                                       confidence=float(scores[i][j]),
+                                       bbox=[float(xmin), float(ymin), float(xmax), float(ymax)]))
+            all_detections.append(detections)
+        return all_detections
+
+    def infer(self, x):
+        """Runs the model on input already converted by preprocess_fn."""
+        outputs = self.session.run(self.output_names, {self.input_name: x})
+        return self._parse_outputs(outputs)
+
+    def execute(self, *inputs):
+        return self.infer(self.preprocess_fn(*inputs))
+
+    def execute_batch(self, images):
+        batch = np.concatenate([self.preprocess_fn(image) for image in images])
+        outputs = self.session.run(self.output_names, {self.input_name: batch})
+        return self._parse_outputs(outputs)
+
+    def __call__(self, *inputs):
+        return self.execute(*inputs)
@@ -0,0 +1,150 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import collections
+import threading
+import time
+import cv2
+import numpy as np
+
+
+# Pipeline stages in the order a frame passes through them. A trace only marks
+# the stages on its own path, e.g. the inference path has no encode stage.
+Stages = ('grab', 'receive', 'convert', 'wait', 'preprocess', 'gate', 'inference', 'postprocess', 'annotate', 'encode', 'publish')
+
+
+class FrameTrace(object):
+    """
+    Per-frame record of when each pipeline stage finished (time.monotonic()).
+
+    'receive' is when the camera thread got the complete frame from FFMPEG, so the
+    duration of every later stage is measured from the stage marked before it.
+    'grab' is when the grab() call that returned the frame started, so the
+    'receive' duration is that call: waiting for the packets plus the H.264
+    decode. 'convert' is retrieve(), the YUV to BGR conversion. 'total' is
+    measured from 'receive', the wait for the next frame is not part of it.
+    'wait' is when a consumer took the decoded frame, so the time a frame sat
+    waiting is not counted as work of the stage after it. Frames the motion gate
+    let reuse the previous detections mark 'gate' instead of 'inference'.
+    """
+
+    __slots__ = ('times',)
+
+    def __init__(self, receive=None):
+        self.times = {}
+        if receive is not None:
+            self.times['receive'] = receive
+
+    def mark(self, stage, timestamp=None):
+        self.times[stage] = time.monotonic() if timestamp is None else timestamp
+
+    def durations(self):
+        """
+        Returns:
+            dict: Seconds spent in each marked stage, plus 'total' from receive to the last mark
+        """
+        durations = {}
+        previous = None
+        for stage in Stages:
+            if stage not in self.times:
+                continue
+            if previous is not None:
+                durations[stage] = self.times[stage] - self.times[previous]
+            previous = stage
+        if 'receive' in self.times and previous is not None:
+            durations['total'] = self.times[previous] - self.times['receive']
+        return durations
+
+
+class TraceCollector(SingletonConfigurable):
+    """
+    Aggregates FrameTraces into per-stage latency histograms.
+
+    Traces are recorded per path ('inference' for MLProcess, 'display' for the
+    preview), because the two paths run at different rates on different frames.
+
+    Traitlets:
+        active (Bool): Record traces, when False record() returns immediately
+        window (Integer): Number of recent frames kept per path
+    """
+
+    active = traitlets.Bool(default_value=True).tag(config=True)
+    window = traitlets.Integer(default_value=300).tag(config=True)
+
+    def __init__(self, *args, **kwargs):
+        super(TraceCollector, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def _path(self, name):
+        path = self._paths.get(name)
+        if path is None:
+            path = dict(stages=collections.defaultdict(lambda: collections.deque(maxlen=self.window)),
+                        published=collections.deque(maxlen=self.window))
+            self._paths[name] = path
+        return path
+
+    def record(self, trace, path='inference'):
+        if not self.active:
+            return
+        durations = trace.durations()
+        with self._lock:
+            entry = self._path(path)
+            for stage, duration in durations.items():
+                entry['stages'][stage].append(duration)
+            entry['published'].append(trace.times.get('publish', time.monotonic()))
+
+    def reset(self):
+        with self._lock:
+            self._paths = {}
+
+    def fps(self, path='inference'):
+        """Frames per second published on path over the recorded window."""
+        with self._lock:
+            published = list(self._paths[path]['published']) if path in self._paths else []
+        if len(published) < 2 or published[-1] <= published[0]:
+            return 0.0
+        return (len(published) - 1) / (published[-1] - published[0])
+
+    def stage_percentiles(self, path=None):
+        """
+        Parameters:
+            path (str): Only report this path, default all paths
+
+        Returns:
+            dict: {path: {stage: {count, mean, p50, p90, p99, max} in ms}, 'fps': fps}}
+        """
+        with self._lock:
+            names = [path] if path is not None else list(self._paths)
+            snapshot = {name: {stage: list(samples) for stage, samples in self._paths[name]['stages'].items()}
+                        for name in names if name in self._paths}
+
+        report = {}
+        for name, stages in snapshot.items():
+            entry = {}
+            for stage in Stages + ('total',):
+                if not stages.get(stage):
+                    continue
+                ms = np.array(stages[stage]) * 1000.0
+                entry[stage] = dict(count=int(len(ms)),
+                                    mean=float(np.mean(ms)),
+                                    p50=float(np.percentile(ms, 50)),
+                                    p90=float(np.percentile(ms, 90)),
+                                    p99=float(np.percentile(ms, 99)),
+                                    max=float(np.max(ms)))
+            entry['fps'] = self.fps(name)
+            report[name] = entry
+        return report
+
+
+def draw_hud(frame, collector, color=(0, 255, 255)):
+    """Draws the median stage timings and FPS of every path in the top left corner of frame."""
+    y = 12
+    for name, stages in collector.stage_percentiles().items():
+        cv2.putText(frame, '%s %.1f fps' % (name, stages['fps']), (4, y), cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+        y += 11
+        for stage in Stages[1:] + ('total',):
+            if stage in stages:
+                cv2.putText(frame, ' %-11s %6.1f ms' % (stage, stages[stage]['p50']), (4, y),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+                y += 11
+    return frame
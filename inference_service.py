@@ -0,0 +1,261 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import collections
+import queue
+import threading
+import time
+import numpy as np
+
+try:
+    from NVidia.object_detection import ObjectDetector
+except ImportError: # no TensorRT off the Jetson, pass a CPUObjectDetector as the model
+    ObjectDetector = None
+
+
+class InferenceRequest(object):
+    """
+    A single frame submitted to the InferenceService.
+
+    Public Attributes:
+        stream_id: Identifies the producer that submitted the frame
+        detections (list): Detections for the frame, set when the request completes
+        queue_delay (float): Seconds the frame waited before its batch was run
+    """
+
+    def __init__(self, image, stream_id):
+        self.image = image
+        self.stream_id = stream_id
+        self.submitted = time.monotonic()
+        self.detections = None
+        self.queue_delay = None
+        self._error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the batch containing this frame has been processed.
+
+        Returns:
+            list: Detections for the frame (same format as ObjectDetector)
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError('Inference request timed out')
+        if self._error is not None:
+            raise RuntimeError('Inference failed: ' + repr(self._error))
+        return self.detections
+
+
+class InferenceService(SingletonConfigurable):
+    """
+    Shares one detector between several frame producers (drones, cameras).
+
+    Frames submitted from any thread are collected into dynamic batches. A batch
+    is run as soon as it is full or the oldest frame has waited max_latency
+    seconds, and the results are routed back to each caller.
+
+    Traitlets:
+        started (Bool): True while the batching thread is running
+        max_batch_size (Integer): Largest batch passed to the model. Clamped to
+            the engine's own max batch size.
+        max_latency (Float): Seconds the oldest frame may wait for a batch to fill
+
+    Note: The instance can be passed to MLProcess as its model, it is called the
+    same way as an ObjectDetector. It starts itself on the first submitted frame.
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+    max_batch_size = traitlets.Integer(default_value=4).tag(config=True)
+    max_latency = traitlets.Float(default_value=0.010).tag(config=True)
+
+    def __init__(self, model=None, *args, **kwargs):
+        super(InferenceService, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+
+        # private members
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+        if model is None:
+            if ObjectDetector is None:
+                raise RuntimeError("TensorRT is not available, pass a model")
+            try:
+                model = ObjectDetector('ssd_mobilenet_v2_v04_coco.engine')
+            except:
+                print('error loading model')
+                raise RuntimeError("The DNN model failed to load")
+        self._model = model
+
+        atexit.register(self.stop)
+
+    def start(self):
+        with self._start_lock: # producers may start it concurrently from submit()
+            if not self.started:
+                self.set_trait('started', True)
+                self._thread = threading.Thread(target=self._serve, args=(), name='inference-service')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        with self._start_lock:
+            if self.started:
+                self.set_trait('started', False)
+                self._thread.join()
+
+    def submit(self, image, stream_id=None):
+        """
+        Queues a frame for detection without waiting for the result, starting the service if needed.
+
+        Parameters:
+            image (ndarray): BGR frame, already resized for the model
+            stream_id: Producer identifier, defaults to the calling thread's ident
+                (thread names are not unique, every MLProcess thread is 'ml-process')
+
+        Returns:
+            InferenceRequest: Call wait() on it to get the detections
+        """
+        if stream_id is None:
+            stream_id = threading.get_ident()
+        if not self.started:
+            self.start()
+        request = InferenceRequest(image, stream_id)
+        self._queue.put(request)
+        return request
+
+    def execute(self, image, stream_id=None):
+        """Runs detection on one frame, blocking until its batch completes."""
+        return [self.submit(image, stream_id).wait()]
+
+    def __call__(self, image, stream_id=None):
+        return self.execute(image, stream_id)
+
+    def stats(self):
+        """
+        Summarises batching performance since the last reset_stats().
+
+        Returns:
+            dict: streams - distinct producers seen
+                  frames, batches, mean_batch_size
+                  throughput_fps - frames completed per second of wall time
+                  model_fps - frames per second of model execution time
+                  batch_gain - model_fps relative to running every frame at batch size 1
+                  queue_delay_ms - p50, p95 and max of the time frames waited for a batch
+        """
+        with self._stats_lock:
+            elapsed = time.monotonic() - self._stats_start
+            frames = self._frames
+            batches = self._batches
+            model_time = self._model_time
+            streams = len(self._stream_frames)
+            delays = np.array(self._queue_delays) * 1000.0
+            single_times = self._batch_times.get(1)
+
+        stats = dict(streams=streams,
+                     frames=frames,
+                     batches=batches,
+                     mean_batch_size=frames / batches if batches else 0.0,
+                     throughput_fps=frames / elapsed if elapsed > 0 else 0.0,
+                     model_fps=frames / model_time if model_time > 0 else 0.0,
+                     batch_gain=None,
+                     queue_delay_ms=None)
+
+        if single_times and model_time > 0:
+            stats['batch_gain'] = float(np.mean(single_times)) * frames / model_time
+
+        if len(delays):
+            stats['queue_delay_ms'] = dict(p50=float(np.percentile(delays, 50)),
+                                           p95=float(np.percentile(delays, 95)),
+                                           max=float(np.max(delays)))
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats_start = time.monotonic()
+        self._frames = 0
+        self._batches = 0
+        self._model_time = 0.0
+        self._stream_frames = collections.Counter()
+        self._queue_delays = collections.deque(maxlen=1000)
+        self._batch_times = collections.defaultdict(lambda: collections.deque(maxlen=100))
+
+    def _batch_limit(self):
+        engine_limit = getattr(self._model, 'max_batch_size', None)
+        if engine_limit:
+            return max(1, min(self.max_batch_size, engine_limit))
+        return max(1, self.max_batch_size)
+
+    def _collect_batch(self):
+        """Waits for a first frame, then fills the batch until it is full or the latency budget is spent."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        limit = self._batch_limit()
+        deadline = first.submitted + self.max_latency
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        start = time.monotonic()
+        for request in batch:
+            request.queue_delay = start - request.submitted
+
+        try:
+            if len(batch) > 1 and hasattr(self._model, 'execute_batch'):
+                results = self._model.execute_batch([request.image for request in batch])
+            else:
+                results = [self._model(request.image)[0] for request in batch]
+            if len(results) != len(batch):
+                raise RuntimeError('model returned %d results for a batch of %d' % (len(results), len(batch)))
+        except Exception as msg:
+            for request in batch:
+                request._error = msg
+                request._done.set()
+            return
+
+        duration = time.monotonic() - start
+        for request, detections in zip(batch, results):
+            request.detections = detections
+            request.image = None
+            request._done.set()
+
+        with self._stats_lock:
+            self._frames += len(batch)
+            self._batches += 1
+            self._model_time += duration
+            self._batch_times[len(batch)].append(duration)
+            for request in batch:
+                self._stream_frames[request.stream_id] += 1
+                self._queue_delays.append(request.queue_delay)
+
+    def _serve(self):
+        while self.started:
+            batch = self._collect_batch()
+            if batch:
+                self._run_batch(batch)
+
+        # release anybody still waiting
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request._error = RuntimeError('InferenceService stopped')
+            request._done.set()
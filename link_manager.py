@@ -0,0 +1,177 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import threading
+import time
+
+
+class LinkManager(SingletonConfigurable):
+    """
+    Watches the status and video links and reconnects in place when they drop.
+
+    The link counts as lost when no status packet arrived for status_timeout
+    seconds, or no video frame for video_timeout seconds while the camera is
+    running. Recovery stops MLProcess, closes and rebinds the Tello sockets,
+    re-sends 'command' and 'streamon', reopens the camera and restarts
+    MLProcess once status and video flow again. The existing singletons are
+    reused, so observers in the notebook or service keep working.
+
+    Traitlets:
+        started (Bool): True while the manager is running
+        link_up (Bool): False from the detection of a loss until recovery
+        check_interval (Float): Seconds between link checks, bounds the extra detection delay
+        status_timeout (Float): Seconds without status before the link is lost
+        video_timeout (Float): Seconds without a video frame before the link is lost
+        retry_interval (Float): Seconds between reconnect attempts
+        recovery_timeout (Float): Seconds to wait for status and video after a reconnect
+
+    Public Attributes:
+        events (list): One dict per outage, see metrics()
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+    link_up = traitlets.Bool(default_value=False, read_only=True)
+
+    check_interval = traitlets.Float(default_value=0.1).tag(config=True)
+    status_timeout = traitlets.Float(default_value=1.0).tag(config=True)
+    video_timeout = traitlets.Float(default_value=2.0).tag(config=True)
+    retry_interval = traitlets.Float(default_value=1.0).tag(config=True)
+    recovery_timeout = traitlets.Float(default_value=5.0).tag(config=True)
+
+    def __init__(self, tello=None, camera=None, mlp=None, *args, **kwargs):
+        """
+        Parameters:
+            tello (Tello): Drone whose links are watched
+            camera (StreamCamera): Video stream to watch and reopen, optional
+            mlp (MLProcess): Stopped during recovery and restarted after, optional
+        """
+        super(LinkManager, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+        self.set_trait('link_up', False)
+        self.events = []
+
+        # private members
+        self._tello = tello
+        self._camera = camera
+        self._mlp = mlp
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        atexit.register(self.stop)
+
+    def start(self):
+        if not self.started:
+            self.set_trait('started', True)
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._watch, args=(), name='link-manager')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._stop_event.set()
+            self._thread.join()
+
+    def metrics(self):
+        """
+        Summarises the outages seen so far.
+
+        Returns:
+            dict: outages, recovered,
+                  time_to_detect_s - mean and max seconds from the last status/frame to detection
+                  time_to_recover_s - mean and max seconds from detection to status and video flowing again
+                  last - the newest event: reason, lost_at, detected_at, recovered_at,
+                         time_to_detect, time_to_recover, attempts
+        """
+        events = list(self.events)
+        detect = [e['time_to_detect'] for e in events]
+        recover = [e['time_to_recover'] for e in events if e['time_to_recover'] is not None]
+
+        def summary(values):
+            if not values:
+                return None
+            return dict(mean=sum(values) / len(values), max=max(values))
+
+        return dict(outages=len(events),
+                    recovered=len(recover),
+                    time_to_detect_s=summary(detect),
+                    time_to_recover_s=summary(recover),
+                    last=dict(events[-1]) if events else None)
+
+    def _last_frame(self):
+        if self._camera is None or not self._camera.started:
+            return None
+        return self._camera.get_stamped_frame()[2]
+
+    def _check(self, now):
+        """
+        Returns:
+            (str, float): Reason and time the link was last seen working, or (None, None)
+        """
+        last_status = self._tello.status_timestamp
+        if last_status is not None and now - last_status > self.status_timeout:
+            return ('status', last_status)
+        last_frame = self._last_frame()
+        if last_frame is not None and now - last_frame > self.video_timeout:
+            return ('video', last_frame)
+        return (None, None)
+
+    def _flowing(self, since):
+        """True once status and (if watched) video have arrived after since."""
+        status = self._tello.status_timestamp
+        if status is None or status <= since:
+            return False
+        if self._camera is not None:
+            frame = self._camera.get_stamped_frame()[2]
+            if frame is None or frame <= since:
+                return False
+        return True
+
+    def _recover(self, event):
+        mlp_started = self._mlp is not None and self._mlp.started
+        if mlp_started:
+            self._mlp.stop()
+
+        while not self._stop_event.is_set():
+            event['attempts'] += 1
+            attempt = time.monotonic()
+            if self._tello.reconnect() and (self._camera is None or self._tello.streamon()):
+                if self._camera is not None:
+                    self._camera.reopen()
+                deadline = time.monotonic() + self.recovery_timeout
+                while not self._flowing(attempt) and time.monotonic() < deadline:
+                    if self._stop_event.wait(self.check_interval):
+                        break
+                if self._flowing(attempt):
+                    event['recovered_at'] = time.monotonic()
+                    event['time_to_recover'] = event['recovered_at'] - event['detected_at']
+                    break
+            self._stop_event.wait(self.retry_interval)
+
+        if mlp_started:
+            self._mlp.start()
+
+    def _watch(self):
+        while not self._stop_event.wait(self.check_interval):
+            now = time.monotonic()
+            if not self.link_up:
+                # nothing to recover until the link has worked once
+                if self._tello.status_timestamp is not None and self._check(now)[0] is None:
+                    self.set_trait('link_up', True)
+                continue
+
+            reason, last_seen = self._check(now)
+            if reason is None:
+                continue
+
+            self.set_trait('link_up', False)
+            event = dict(reason=reason, lost_at=last_seen, detected_at=now, time_to_detect=now - last_seen,
+                         recovered_at=None, time_to_recover=None, attempts=0)
+            self.events.append(event)
+            print('link lost (%s), %.2f s after the last packet' % (reason, event['time_to_detect']))
+            self._recover(event)
+            if event['time_to_recover'] is not None:
+                self.set_trait('link_up', True)
+                print('link recovered in %.2f s after %d attempt(s)' % (event['time_to_recover'], event['attempts']))
@@ -4,48 +4,98 @@ import atexit
 import cv2
 import threading
 import time
+import numpy as np
 
-from NVidia.object_detection import *
+try:
+    from NVidia.object_detection import ObjectDetector
+except ImportError: # no TensorRT off the Jetson, pass a CPUObjectDetector as the model
+    ObjectDetector = None
+
+from overlay import DetectionOverlay
+from visual_servo import VisualServoController
+from telemetry import angle_difference
+from frame_trace import TraceCollector
+from motion_gate import MotionGate
+from inference_service import InferenceService
 
 
 class MLProcess(SingletonConfigurable):
     
     started = traitlets.Bool(default_value=False, read_only=True)
-    processed_image = traitlets.Any(default_value=None)
+    frame_version = traitlets.Integer(default_value=0, read_only=True) # observe this, fetch the frame with get_processed_image()
+
+    pool_size = traitlets.Integer(default_value=4).tag(config=True) # preallocated 300x300 output frames
+
+    camera_hfov = traitlets.Float(default_value=70.0).tag(config=True) # degrees, Tello 82.6 diagonal at 4:3
+    ego_motion_compensation = traitlets.Bool(default_value=True).tag(config=True)
 
-    def __init__(self, tello=None, camera=None, *args, **kwargs):
+    motion_gate = traitlets.Bool(default_value=True).tag(config=True) # reuse detections while the scene is static, not while tracking
+    motion_threshold = traitlets.Float(default_value=4.0).tag(config=True) # mean gray level change, 0-255
+    motion_refresh = traitlets.Float(default_value=1.0).tag(config=True) # seconds between forced detections
+
+    def __init__(self, tello=None, camera=None, model=None, controller=None, stream_id=None, *args, **kwargs):
+        """
+        Parameters:
+            tello (Tello): Drone to steer while tracking
+            camera (StreamCamera): Source of video frames
+            model: Detector to run on each frame. Defaults to loading the TensorRT
+                engine. Pass a shared InferenceService to batch frames from several
+                streams through one model.
+            controller (VisualServoController): Steers the drone while tracking.
+                Defaults to a new controller for tello, not the shared instance,
+                so every drone is steered by its own control loop.
+            stream_id: Identifies this process to a shared InferenceService, default id(self)
+        """
         super(MLProcess, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
 
         # required interface members
         self.set_trait('started', False)
-        self.processed_image = None
         self.detections_active = False
         self.tracking_active = False
         self.target_selection = 0
         self.filtered_detections = []
+        self.frame_telemetry = None
+        self.overlay = DetectionOverlay()
+        self.gate = MotionGate()
+        self.stream_id = stream_id if stream_id is not None else id(self)
         
         # private members
+        self._pool = [np.zeros((300, 300, 3), dtype=np.uint8) for _ in range(max(2, self.pool_size))]
+        self._pool_versions = [0] * len(self._pool)
         self._camera = camera
         self._tello = tello
-        self._thread = threading.Thread(target=self._mlp, args=())
+        self._thread = None
+        self._traces = TraceCollector.instance()
+        if controller is None:
+            controller = VisualServoController(tello=tello, config=self.config)
+        self._controller = controller
+        self._detections = None # (detector output, frame timestamp, frame telemetry), reused while the scene is unchanged
        
-        try:
-            self._model = ObjectDetector('ssd_mobilenet_v2_v04_coco.engine')
-        except:
-            print('error loading model')
-            raise RuntimeError("The DNN model failed to load")
+        if model is None:
+            if ObjectDetector is None:
+                raise RuntimeError("TensorRT is not available, pass a model")
+            try:
+                model = ObjectDetector('ssd_mobilenet_v2_v04_coco.engine')
+            except:
+                print('error loading model')
+                raise RuntimeError("The DNN model failed to load")
+        self._model = model
         
 
     def start(self) :
         if not self.started :
             self.set_trait('started', True)
+            self._thread = threading.Thread(target=self._mlp, args=(), name='ml-process-%s' % self.stream_id)
+            self._thread.daemon = True
             self._thread.start()    
+            self._controller.start()
             atexit.register(self.stop)
 
     def stop(self) :
         if self.started:
             self.set_trait('started', False)
             self._thread.join()  
+            self._controller.stop()
 
     def _detection_center(self, detection):
         """
@@ -83,78 +133,146 @@ class MLProcess(SingletonConfigurable):
                 closest_detection = det
         return closest_detection
         
+    @property
+    def processed_image(self):
+        """The newest processed 300x300 frame, or None before the first frame."""
+        return self.get_processed_image()
+
+    def get_processed_image(self, version=None):
+        """
+        Fetches a processed frame from the pool.
+
+        The pool is reused round-robin, so a frame is only valid until pool_size - 1
+        newer frames have been published. Copy it if it has to be kept longer.
+
+        Parameters:
+            version (int): frame_version to fetch, default the newest
+
+        Returns:
+            ndarray: The 300x300 BGR frame, or None if that version is no longer in the pool
+        """
+        if version is None:
+            version = self.frame_version
+        if version <= 0:
+            return None
+        slot = version % len(self._pool)
+        if self._pool_versions[slot] != version:
+            return None
+        return self._pool[slot]
+
+    def _frame_state(self, timestamp):
+        """Drone telemetry interpolated to the receive time of a frame, or None."""
+        if self._tello is None or timestamp is None:
+            return None
+        return self._tello.telemetry.at(timestamp)
+
+    def _compensate_yaw(self, center_x, then):
+        """
+        Moves a target position seen in an old frame to where it is now, using the
+        yaw the drone has turned through since the frame was received.
+
+        Parameters:
+            then (dict): Telemetry of the frame the target was detected in
+        """
+        if self._tello is None:
+            return center_x
+        now = self._tello.telemetry.latest()
+        if then is None or now is None or 'yaw' not in then or 'yaw' not in now:
+            return center_x
+        # turning clockwise (yaw increasing) moves the scene to the left
+        return center_x - angle_difference(now['yaw'], then['yaw']) / self.camera_hfov
+
+    def _detect(self, image, trace):
+        if isinstance(self._model, InferenceService):
+            return self._model(image, self.stream_id)
+        if hasattr(self._model, 'infer'):
+            # convert to the network input here, so it is timed with the resize and not as inference
+            x = self._model.preprocess_fn(image)
+            trace.mark('preprocess')
+            return self._model.infer(x)
+        return self._model(image)
+
+    def _postprocess(self, detections, timestamp, telemetry):
+        """
+        Selects the target, publishes the detections to the overlay and hands the target to the controller.
+
+        Parameters:
+            detections (list): Detector output for one frame
+            timestamp (float): Receive time of the frame the detections were found in
+            telemetry (dict): Telemetry of that frame, or None
+        """
+        center_det = None
+
+        # select detections that match selected class label
+        #filtered_detections = []
+
+        if self.target_selection >= 0:
+            self.filtered_detections = [d for d in detections[0] if d['label'] == self.target_selection]     
+            
+            # get detection closest to center of field of view
+            center_det = self._closest_detection(self.filtered_detections)
+
+        # publish detections for the display overlay, drawing happens there
+        matches = self.filtered_detections if self.target_selection >= 0 else []
+        self.overlay.update(detections[0], matches, center_det)
+
+        # hand the target to the controller, it steers on its own clock and
+        # hovers by itself once the target estimate goes stale
+        self._controller.enabled = self.tracking_active
+        if center_det is not None:
+            center_x, center_y = self._detection_center(center_det)
+            if self.ego_motion_compensation:
+                center_x = self._compensate_yaw(center_x, telemetry)
+            self._controller.update_target(center_x, center_y, self._detection_area(center_det), timestamp)
+
     def _mlp(self):
+        last_timestamp = None
         while self.started:
-            rc, frame = self._camera.get_frame()
+            rc, frame, trace = self._camera.get_traced_frame()
+            timestamp = trace.times.get('receive')
+
+            if not rc or timestamp == last_timestamp: # no new frame yet
+                time.sleep(0.001)
+                continue
+            last_timestamp = timestamp
+            trace.mark('wait')
+
+            self.frame_telemetry = self._frame_state(timestamp)
+
+            # resize frome for SDD processing, into the next frame of the pool (round-robin, no allocation)
+            version = self.frame_version + 1
+            slot = version % len(self._pool)
+            self._pool_versions[slot] = 0 # invalid while it is being overwritten
+            image = cv2.resize(frame, (300,300), dst=self._pool[slot], interpolation=cv2.INTER_AREA)
+            trace.mark('preprocess')
             
-            if rc: # valid frame available
+            if self.detections_active:
                 
-                # resize frome for SDD processing
-                image = cv2.resize(frame, (300,300),0,0,interpolation=cv2.INTER_AREA)               
-                
-                if self.detections_active:
-                    
-                    # compute all detected objects
-                    detections = self._model(image)
-
-                    # draw all detections on image
-                    for det in detections[0]:
-                        bbox = det['bbox']
-                        cv2.rectangle(image, (int(300 * bbox[0]), int(300 * bbox[1])), (int(300 * bbox[2]), int(300 * bbox[3])), (255, 0, 0), 2)
-
-                    # select detections that match selected class label
-                    #filtered_detections = []
-
-                    if self.target_selection >= 0:
-                        self.filtered_detections = [d for d in detections[0] if d['label'] == self.target_selection]     
-                        
-                        # draw all matchings detections on image
-                        for det in self.filtered_detections:
-                            bbox = det['bbox']
-                            cv2.rectangle(image, (int(300 * bbox[0]), int(300 * bbox[1])), (int(300 * bbox[2]), int(300 * bbox[3])), (0, 255, 0), 2)
-
-                        # get detection closest to center of field of view
-                        center_det = self._closest_detection(self.filtered_detections)
-                        if center_det is not None:
-                            
-                            bbox = center_det['bbox']
-                            cv2.rectangle(image, (int(300 * bbox[0]), int(300 * bbox[1])), (int(300 * bbox[2]), int(300 * bbox[3])), (0, 0, 255), 2) 
-                            
-                            # if tracking active, center drone on the target object
-                            if self.tracking_active:
-                                
-                                # compute x,z movement to keep the target in the center of the image
-                                center_x, center_y = self._detection_center(center_det)
-                                
-                                if center_x < -0.1:
-                                    x_movement = -10
-                                elif center_x > 0.1:
-                                    x_movement = 10
-                                else: x_movement = 0
-                                    
-                                if center_y < -0.1:
-                                    z_movement = 10
-                                elif center_y > 0.1:
-                                    z_movement = -10
-                                else: z_movement = 0
-                                
-                                # compute y movement to keep constant distance (fixed bounding box area)
-                                area = self._detection_area(center_det)
-                                
-                                if area < 0.04:
-                                    y_movement = 10
-                                elif area > 0.3:
-                                    y_movement = -10
-                                else: y_movement = 0
-                                
-                                self._tello.rc(x_movement, y_movement, z_movement, 0)
-                                time.sleep(0.5)
-                                
-                        else: # lost the target, so stop moving
-                            self._tello.rc(0, 0, 0, 0)
-                            time.sleep(0.5)
-                                                              
-                self.processed_image = image
+                # compute all detected objects, unless the scene has not changed since the last time.
+                # Not gated while tracking, a small moving target may change the frame too little.
+                gated = self.motion_gate and not self.tracking_active
+                if not gated or self.gate.should_run(image, timestamp, self.motion_threshold, self.motion_refresh):
+                    self._detections = (self._detect(image, trace), timestamp, self.frame_telemetry)
+                    if not gated:
+                        self.gate.reset() # take a fresh reference once gating resumes
+                    trace.mark('inference')
+                else:
+                    trace.mark('gate') # reused, must not add a 0 ms sample to the inference latency
+                # reused detections keep the time and telemetry of the frame they were found in
+                detections, detections_timestamp, detections_telemetry = self._detections
+                self._postprocess(detections, detections_timestamp, detections_telemetry)
+                trace.mark('postprocess')
+
+            else:
+                self._controller.enabled = False
+                self.overlay.clear()
+                self._detections = None
+                self.gate.reset()
+                                                          
+            self._pool_versions[slot] = version
+            self.set_trait('frame_version', version)
+            trace.mark('publish')
+            self._traces.record(trace, 'inference')
 
             
     def __exit__(self, exc_type, exc_value, traceback) :
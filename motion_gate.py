@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+
+
+class MotionGate(object):
+    """
+    Decides whether a frame has changed enough since the last detection to run the detector again.
+
+    The frame is shrunk to size x size grayscale and compared with the same
+    signature of the frame the detector last ran on. The change score is the
+    mean absolute difference in gray levels (0 - 255). Comparing against the
+    last detected frame rather than the previous one means a slow drift still
+    adds up and triggers a new detection.
+
+    Public Attributes:
+        executed (int): Frames the detector ran on
+        skipped (int): Frames that reused the previous detections
+        last_score (float): Change score of the newest frame, None before the first comparison
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.executed = 0
+        self.skipped = 0
+        self.last_score = None
+        self._reference = None
+        self._reference_time = None
+        self._signature = np.zeros((size, size), dtype=np.uint8)
+        self._small = np.zeros((size, size, 3), dtype=np.uint8)
+        self._diff = np.zeros((size, size), dtype=np.uint8)
+
+    def reset(self):
+        """Forgets the reference frame, so the next frame runs the detector."""
+        self._reference = None
+        self._reference_time = None
+        self.last_score = None
+
+    def reset_counters(self):
+        self.executed = 0
+        self.skipped = 0
+
+    def score(self, image):
+        """
+        Returns:
+            float: Change score of image against the reference, or None without a reference
+        """
+        cv2.resize(image, (self.size, self.size), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._signature)
+        if self._reference is None:
+            return None
+        cv2.absdiff(self._signature, self._reference, dst=self._diff)
+        return float(cv2.mean(self._diff)[0])
+
+    def should_run(self, image, timestamp, threshold, refresh_interval):
+        """
+        Scores image and counts the decision.
+
+        Parameters:
+            image (ndarray): BGR frame
+            timestamp (float): time.monotonic() of the frame
+            threshold (float): Change score above which the detector runs
+            refresh_interval (float): Seconds after which the detector runs regardless
+
+        Returns:
+            Bool: True if the detector should run on image, False to reuse the previous detections
+        """
+        self.last_score = self.score(image)
+        run = (self.last_score is None or
+               self.last_score > threshold or
+               timestamp - self._reference_time >= refresh_interval)
+        if run:
+            self._reference = self._signature.copy()
+            self._reference_time = timestamp
+            self.executed += 1
+        else:
+            self.skipped += 1
+        return run
+
+    def stats(self):
+        """
+        Returns:
+            dict: executed, skipped, skip_ratio (fraction of frames that reused detections), last_score
+        """
+        frames = self.executed + self.skipped
+        return dict(executed=self.executed,
+                    skipped=self.skipped,
+                    skip_ratio=self.skipped / float(frames) if frames else 0.0,
+                    last_score=self.last_score)
@@ -0,0 +1,236 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import cv2
+import threading
+import time
+import numpy as np
+
+from frame_trace import TraceCollector, draw_hud
+
+
+# COCO label ids as used by the SSD-MobileNet models (index == label id)
+CocoLabels = ['unlabeled', 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck',
+              'boat', 'traffic light', 'fire hydrant', 'street sign', 'stop sign', 'parking meter', 'bench',
+              'bird', 'cat', 'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'hat',
+              'backpack', 'umbrella', 'shoe', 'eye glasses', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis',
+              'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+              'tennis racket', 'bottle', 'plate', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl',
+              'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut',
+              'cake', 'chair', 'couch', 'potted plant', 'bed', 'mirror', 'dining table', 'window', 'desk',
+              'toilet', 'door', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone', 'microwave',
+              'oven', 'toaster', 'sink', 'refrigerator', 'blender', 'book', 'clock', 'vase', 'scissors',
+              'teddy bear', 'hair drier', 'toothbrush']
+
+DetectionColor = (255, 0, 0)    # every detection
+MatchColor = (0, 255, 0)        # detections of the selected target class
+TargetColor = (0, 0, 255)       # the tracked target
+
+
+def label_name(label):
+    if 0 <= label < len(CocoLabels):
+        return CocoLabels[label]
+    return str(label)
+
+
+class DetectionOverlay(object):
+    """
+    Holds the latest detections published by the inference thread.
+
+    The inference thread calls update() and never draws. Whoever displays video
+    calls draw() on the frame it is about to show, so the boxes are rendered at
+    display rate on the current frame rather than on the frame the model used.
+    Boxes are normalised, so any frame size can be annotated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._detections = []
+        self._matches = []
+        self._target = None
+        self.timestamp = None
+
+    def update(self, detections, matches=(), target=None):
+        """
+        Parameters:
+            detections (list): All detections for the latest frame
+            matches (list): Detections of the selected target class
+            target (dict): The detection being tracked, or None
+        """
+        with self._lock:
+            self._detections = list(detections)
+            self._matches = list(matches)
+            self._target = target
+            self.timestamp = time.monotonic()
+
+    def clear(self):
+        self.update([])
+
+    def snapshot(self):
+        with self._lock:
+            return (self._detections, self._matches, self._target)
+
+    def draw(self, frame):
+        """Draws boxes, labels and confidence onto frame in place and returns it."""
+        detections, matches, target = self.snapshot()
+        height, width = frame.shape[:2]
+
+        for det in detections:
+            if det is target or det in matches:
+                continue
+            self._draw_box(frame, det, width, height, DetectionColor)
+        for det in matches:
+            if det is not target:
+                self._draw_box(frame, det, width, height, MatchColor)
+        if target is not None:
+            self._draw_box(frame, target, width, height, TargetColor)
+
+        return frame
+
+    def _draw_box(self, frame, det, width, height, color):
+        bbox = det['bbox']
+        p0 = (int(width * bbox[0]), int(height * bbox[1]))
+        p1 = (int(width * bbox[2]), int(height * bbox[3]))
+        cv2.rectangle(frame, p0, p1, color, 2)
+        text = '%s %.2f' % (label_name(det['label']), det['confidence'])
+        cv2.putText(frame, text, (p0[0], max(p0[1] - 4, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+
+class OverlayRenderer(SingletonConfigurable):
+    """
+    Produces the preview video: the newest camera frame with the latest detections drawn on it.
+
+    The renderer only runs between start() and stop(), so the preview consumer
+    (the notebook video widget) starts it when it is shown. Inference is never
+    slowed down by drawing.
+
+    Frames are rendered into a preallocated pool, reused round-robin, and
+    published by bumping frame_version instead of assigning a new array.
+
+    Traitlets:
+        started (Bool): True while rendering
+        frame_version (Integer): Counts rendered frames, observe it and fetch the frame with get_annotated_image()
+        jpeg (Bytes): Latest annotated frame as JPEG, only set when encode_jpeg is True
+        fps (Float): Display rate
+        width, height (Integer): Size of the preview frames
+        encode_jpeg (Bool): Also publish each frame JPEG encoded
+        jpeg_quality (Integer): 0 to 100
+        hud_active (Bool): Draw live stage timings and FPS from the TraceCollector
+        pool_size (Integer): Number of preallocated preview frames
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+    frame_version = traitlets.Integer(default_value=0, read_only=True)
+    jpeg = traitlets.Bytes(default_value=None, allow_none=True)
+
+    fps = traitlets.Float(default_value=15.0).tag(config=True)
+    width = traitlets.Integer(default_value=300).tag(config=True)
+    height = traitlets.Integer(default_value=300).tag(config=True)
+    encode_jpeg = traitlets.Bool(default_value=False).tag(config=True)
+    jpeg_quality = traitlets.Integer(default_value=80).tag(config=True)
+    hud_active = traitlets.Bool(default_value=False).tag(config=True)
+    pool_size = traitlets.Integer(default_value=4).tag(config=True)
+
+    def __init__(self, camera=None, overlay=None, *args, **kwargs):
+        """
+        Parameters:
+            camera (StreamCamera): Source of the frames to display
+            overlay (DetectionOverlay): Detections to draw, usually MLProcess.overlay
+        """
+        super(OverlayRenderer, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+
+        # private members
+        self._pool = []
+        self._pool_versions = []
+        self._camera = camera
+        self._overlay = overlay if overlay is not None else DetectionOverlay()
+        self._thread = None
+        self._traces = TraceCollector.instance()
+
+        atexit.register(self.stop)
+
+    def start(self):
+        if not self.started:
+            self.set_trait('started', True)
+            self._thread = threading.Thread(target=self._render, args=(), name='overlay-renderer')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._thread.join()
+
+    @property
+    def annotated_image(self):
+        """The newest annotated frame, or None before the first frame."""
+        return self.get_annotated_image()
+
+    def get_annotated_image(self, version=None):
+        """
+        Fetches an annotated frame from the pool.
+
+        A frame is only valid until pool_size - 1 newer frames have been
+        rendered. Copy it if it has to be kept longer.
+
+        Parameters:
+            version (int): frame_version to fetch, default the newest
+
+        Returns:
+            ndarray: The BGR frame, or None if that version is no longer in the pool
+        """
+        if version is None:
+            version = self.frame_version
+        pool, versions = self._pool, self._pool_versions
+        if version <= 0 or not pool:
+            return None
+        slot = version % len(pool)
+        if versions[slot] != version:
+            return None
+        return pool[slot]
+
+    def render(self, frame, dst=None):
+        """Resizes frame to the preview size, into dst if given, and annotates it."""
+        image = cv2.resize(frame, (self.width, self.height), dst=dst, interpolation=cv2.INTER_AREA)
+        return self._overlay.draw(image)
+
+    def _next_slot(self, version):
+        shape = (self.height, self.width, 3)
+        if len(self._pool) != max(2, self.pool_size) or self._pool[0].shape != shape:
+            # first frame or the preview size changed, frames of the old pool are no longer served
+            self._pool_versions = [0] * max(2, self.pool_size)
+            self._pool = [np.zeros(shape, dtype=np.uint8) for _ in self._pool_versions]
+        slot = version % len(self._pool)
+        self._pool_versions[slot] = 0 # invalid while it is being overwritten
+        return slot
+
+    def _render(self):
+        next_time = time.monotonic()
+        while self.started:
+            rc, frame, trace = self._camera.get_traced_frame()
+            if rc:
+                trace.mark('wait')
+                version = self.frame_version + 1
+                slot = self._next_slot(version)
+                image = self.render(frame, self._pool[slot])
+                trace.mark('annotate')
+                if self.hud_active:
+                    draw_hud(image, self._traces)
+
+                if self.encode_jpeg:
+                    jpeg = bytes(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])[1])
+                    trace.mark('encode')
+                    self.jpeg = jpeg
+                self._pool_versions[slot] = version
+                self.set_trait('frame_version', version)
+                trace.mark('publish')
+                self._traces.record(trace, 'display')
+
+            next_time += 1.0 / self.fps
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic() # fell behind, don't try to catch up
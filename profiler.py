@@ -0,0 +1,188 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import collections
+import os
+import sys
+import threading
+import time
+
+
+def thread_label(name, ident):
+    """'name:ident', thread names alone are not unique (e.g. one 'ws-telemetry' per connection)."""
+    return '%s:%d' % (name, ident)
+
+
+def thread_cpu_times():
+    """
+    CPU time used by each live thread so far.
+
+    Uses the per-thread CPU clocks, so it is Linux/Unix only.
+
+    Returns:
+        dict: Thread ident -> (name, CPU seconds). Empty if per-thread clocks are not available.
+    """
+    if not hasattr(time, 'pthread_getcpuclockid'):
+        return {}
+    times = {}
+    for thread in threading.enumerate():
+        if thread.ident is None:
+            continue
+        try:
+            clock = time.pthread_getcpuclockid(thread.ident)
+            times[thread.ident] = (thread.name, time.clock_gettime(clock))
+        except (OSError, ProcessLookupError): # thread exited meanwhile
+            pass
+    return times
+
+
+def thread_cpu_usage(interval=1.0):
+    """
+    Measures how busy each thread is.
+
+    Parameters:
+        interval (float): Seconds to measure over, the caller blocks for this long
+
+    Returns:
+        dict: thread_label() -> percent of one core used during the interval, busiest first.
+              Threads that exited during the interval are left out.
+    """
+    before = thread_cpu_times()
+    start = time.monotonic()
+    time.sleep(interval)
+    after = thread_cpu_times()
+    elapsed = time.monotonic() - start
+    usage = {thread_label(name, ident): 100.0 * (seconds - before.get(ident, (name, 0.0))[1]) / elapsed
+             for ident, (name, seconds) in after.items()}
+    return dict(sorted(usage.items(), key=lambda item: -item[1]))
+
+
+class SamplingProfiler(SingletonConfigurable):
+    """
+    Samples the Python stacks of all threads while started.
+
+    Every sample_interval seconds the current frame of every other thread is
+    read with sys._current_frames() and its stack counted. Nothing is hooked
+    into the profiled threads, and nothing runs at all while stopped. The
+    counts are written as collapsed stacks ('thread;file:function;... count'),
+    the input format of flamegraph.pl and speedscope.
+
+    Traitlets:
+        started (Bool): True while sampling
+        sample_interval (Float): Seconds between samples
+        output_dir (Unicode): Directory profile() writes to
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+
+    sample_interval = traitlets.Float(default_value=0.005).tag(config=True)
+    output_dir = traitlets.Unicode(default_value='profiles').tag(config=True)
+
+    def __init__(self, *args, **kwargs):
+        super(SamplingProfiler, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self.cpu_seconds = {} # thread_label() -> CPU time used between start() and stop()
+
+        # private members
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._cpu_start = {}
+
+        atexit.register(self.stop)
+
+    def start(self):
+        """Clears the previous samples and starts sampling."""
+        if not self.started:
+            self.set_trait('started', True)
+            with self._lock:
+                self.samples = 0
+                self.stacks = collections.Counter()
+            self.cpu_seconds = {}
+            self._cpu_start = thread_cpu_times()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._sample, args=(), name='profiler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._stop_event.set()
+            self._thread.join()
+            end = thread_cpu_times()
+            self.cpu_seconds = {thread_label(name, ident): seconds - self._cpu_start.get(ident, (name, 0.0))[1]
+                                for ident, (name, seconds) in end.items() if name != 'profiler'}
+
+    def profile(self, duration, name=None):
+        """
+        Samples for duration seconds and writes the collapsed stacks to output_dir.
+
+        Parameters:
+            duration (float): Seconds to sample, the caller blocks for this long
+            name (str): File name, default profile-<time>.collapsed
+
+        Returns:
+            str: Path of the written file
+        """
+        self.start()
+        self._stop_event.wait(duration)
+        self.stop()
+        if name is None:
+            name = time.strftime('profile-%Y%m%d-%H%M%S.collapsed')
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        self.write_collapsed(path)
+        return path
+
+    def write_collapsed(self, path):
+        """Writes one 'thread;frame;frame... count' line per distinct stack, root first."""
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        with open(path, 'w') as f:
+            for stack, count in stacks:
+                f.write('%s %d\n' % (stack, count))
+
+    def top_functions(self, count=20):
+        """
+        Summarises the samples per function.
+
+        Returns:
+            list: (function, self samples, total samples), most self samples first.
+                  Self counts the function at the top of the stack, total anywhere in it.
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        with self._lock:
+            stacks = list(self.stacks.items())
+        for stack, samples in stacks:
+            frames = stack.split(';')[1:]
+            if frames:
+                own[frames[-1]] += samples
+            for frame in set(frames):
+                total[frame] += samples
+        return [(frame, samples, total[frame]) for frame, samples in own.most_common(count)]
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            sampled = []
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                sampled.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                self.samples += 1
+                self.stacks.update(sampled)
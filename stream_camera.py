@@ -1,15 +1,24 @@
 import traitlets
 from traitlets.config.configurable import SingletonConfigurable
 import atexit
+import collections
 import cv2
+import numpy as np
 import threading
 import time
 
+from frame_trace import FrameTrace
+
 
 class StreamCamera(SingletonConfigurable):
     
     started = traitlets.Bool(default_value=False, read_only=True)
 
+    stream_url = traitlets.Unicode(default_value='udp://0.0.0.0:11111?overrun_nonfatal=1').tag(config=True)
+    expected_fps = traitlets.Float(default_value=30.0).tag(config=True) # frame rate the drone is set to send
+    open_timeout = traitlets.Float(default_value=10.0).tag(config=True) # seconds, OpenCV 4.6+
+    read_timeout = traitlets.Float(default_value=2.0).tag(config=True) # longest grab() on a dead stream
+
 # TODO maybe pass frame as a np array. Keeping it as a np array from the start may be more efficient...
 # TODO remove the locs - these will block all threads
 
@@ -18,43 +27,218 @@ class StreamCamera(SingletonConfigurable):
 
         self.set_trait('started', False)
         self._frame_available = False
+        self._latest = (False, None, None, None, None)
+        self._reset_health()
         #self._read_lock = threading.Lock()
         
-        self._thread = threading.Thread(target=self._capture_frames, args=())
+        self._thread = None
        
-        # TODO - tried to prevent buffering, but seems to have no effect, maybe limited by FFMPEG
-        # https://stackoverflow.com/questions/16944024/udp-streaming-with-ffmpeg-overrun-nonfatal-option
-        self._cap = cv2.VideoCapture('udp://0.0.0.0:11111?overrun_nonfatal=1',cv2.CAP_FFMPEG) 
-        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 2)      
+        self._cap = self._open_capture()
         
         atexit.register(self.stop)
 
+    def _open_capture(self):
+        # TODO - tried to prevent buffering, but seems to have no effect, maybe limited by FFMPEG
+        # https://stackoverflow.com/questions/16944024/udp-streaming-with-ffmpeg-overrun-nonfatal-option
+        if hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC'): # OpenCV 4.6+, bounds how long grab() blocks on a dead stream
+            params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.open_timeout * 1000),
+                      cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.read_timeout * 1000)]
+            cap = cv2.VideoCapture(self.stream_url, cv2.CAP_FFMPEG, params)
+        else:
+            # older OpenCV (JetPack ships 4.1.1) would block for FFMPEG's 30 s interrupt,
+            # so let the udp protocol time out instead (microseconds)
+            cap = cv2.VideoCapture(self._url_with_timeout(), cv2.CAP_FFMPEG)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 2)      
+        return cap
+
+    def _url_with_timeout(self):
+        url = self.stream_url
+        if not url.startswith('udp://') or 'timeout=' in url:
+            return url
+        return '%s%stimeout=%d' % (url, '&' if '?' in url else '?', int(self.read_timeout * 1000000))
+
     def start(self) :
         if not self.started :
+            self._join_capture() # a thread left behind by stop(timeout) must not share the capture
             self.set_trait('started', True)
+            self._thread = threading.Thread(target=self._capture_frames, args=(self._cap,), name='camera-capture')
+            self._thread.daemon = True
             self._thread.start()    
 
-    def stop(self) :
+    def stop(self, timeout=None) :
+        """
+        Stops capturing.
+
+        Parameters:
+            timeout (float): Seconds to wait for the capture thread. grab() blocks
+                for up to read_timeout while the stream is down; start() and reopen()
+                wait for a thread that did not finish in time.
+        """
         if self.started:
             self.set_trait('started', False)
-            self._thread.join()  
+            self._thread.join(timeout)  
+
+    def _join_capture(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def reopen(self):
+        """
+        Reconnects to the stream, e.g. after the drone was told to streamon again.
+
+        The capture thread is stopped, the old capture released (so its udp port
+        is free again) and exactly one new capture opened, so the decoder starts
+        from the next key frame. Capture resumes if it was running. Frames and
+        health counters are kept.
+
+        A capture thread still stuck in grab() after read_timeout is left behind
+        with the old capture, which it releases once grab() returns, so a dead
+        link never holds up the reconnect.
+        """
+        was_started = self.started
+        self.stop(self.read_timeout + 1.0)
+        if self._thread is not None and self._thread.is_alive():
+            self._thread = None # abandoned, see _capture_frames()
+        else:
+            self._cap.release()
+        self._cap = self._open_capture()
+        if was_started:
+            self.start()
             
-    def _capture_frames(self):
-        while self.started:
+    def _capture_frames(self, cap):
+        while self.started and cap is self._cap:
             #self._read_lock.acquire()
-            self._frame_available = self._cap.grab()
+            grab_start = time.monotonic()
+            self._frame_available = cap.grab() # with FFMPEG, waits for the packets and decodes them
+            if cap is not self._cap: # abandoned by reopen() while grab() was blocked
+                break
             #self._read_lock.release()
             #time.sleep(0.03)
+            if self._frame_available:
+                timestamp = time.monotonic() # receive time, taken as soon as the frame is complete
+                re, frame = cap.retrieve() # only the YUV to BGR conversion
+                converted = time.monotonic()
+                # a single tuple assignment, so readers always see a matching frame and timestamp
+                self._latest = (re, frame, timestamp, converted, grab_start)
+                self._record_health(re, grab_start, timestamp, converted)
+            else:
+                self._grab_failures += 1
+        if cap is not self._cap: # reopen() gave up waiting for this thread
+            cap.release()
+
+    def _reset_health(self):
+        self._health_start = time.monotonic()
+        self._frames = 0
+        self._grab_failures = 0
+        self._decode_failures = 0
+        self._missed_frames = 0
+        self._last_receive = None
+        self._gaps = collections.deque(maxlen=300)
+        self._grab_times = collections.deque(maxlen=300)
+        self._convert_times = collections.deque(maxlen=300)
+
+    def _record_health(self, re, grab_start, timestamp, converted):
+        self._frames += 1
+        if not re:
+            self._decode_failures += 1
+        self._grab_times.append(timestamp - grab_start)
+        self._convert_times.append(converted - timestamp)
+        if self._last_receive is not None:
+            gap = timestamp - self._last_receive
+            self._gaps.append(gap)
+            # a gap of several frame intervals means frames were lost on the link or in the decoder
+            expected = 1.0 / self.expected_fps
+            if gap > 1.5 * expected:
+                self._missed_frames += int(round(gap / expected)) - 1
+        self._last_receive = timestamp
+
+    def health(self, reset=False):
+        """
+        Measures how well the video stream is being received.
+
+        Lost UDP packets are not visible through OpenCV, so loss is estimated from
+        frame gaps longer than the expected frame interval plus decode failures.
+
+        Parameters:
+            reset (bool): Start a new measurement window after reading
+
+        Returns:
+            dict: fps, frames, missed_frames, grab_failures, decode_failures,
+                  loss (fraction of expected frames that did not arrive intact),
+                  gap_ms, grab_ms and convert_ms (p50, p95, max),
+                  frame_age_ms (age of the newest frame),
+                  latency_ms (p95 gap + p95 convert, delay a frame can wait before it is usable)
+                  delay_ms (p95 gap beyond the expected frame interval + p95 convert, the
+                            part of latency_ms that does not come from the frame rate itself)
+
+        grab_ms is the grab() call, the H.264 decode plus the wait for the packets,
+        which OpenCV does not separate. convert_ms is retrieve(), YUV to BGR. A
+        decoder that can't keep up stops waiting and stretches the gaps, so it
+        shows in delay_ms.
+        """
+        now = time.monotonic()
+        gaps = np.array(self._gaps) * 1000.0
+        grab_times = np.array(self._grab_times) * 1000.0
+        convert_times = np.array(self._convert_times) * 1000.0
+        frames = self._frames
+        missed = self._missed_frames + self._decode_failures
+        elapsed = now - self._health_start
+
+        def summary(ms):
+            if not len(ms):
+                return None
+            return dict(p50=float(np.percentile(ms, 50)), p95=float(np.percentile(ms, 95)), max=float(np.max(ms)))
+
+        health = dict(fps=frames / elapsed if elapsed > 0 else 0.0,
+                      frames=frames,
+                      missed_frames=self._missed_frames,
+                      grab_failures=self._grab_failures,
+                      decode_failures=self._decode_failures,
+                      loss=missed / float(frames + self._missed_frames) if frames + self._missed_frames else 1.0,
+                      gap_ms=summary(gaps),
+                      grab_ms=summary(grab_times),
+                      convert_ms=summary(convert_times),
+                      frame_age_ms=(now - self._last_receive) * 1000.0 if self._last_receive is not None else None,
+                      latency_ms=None,
+                      delay_ms=None)
+        if len(gaps) and len(convert_times):
+            health['latency_ms'] = health['gap_ms']['p95'] + health['convert_ms']['p95']
+            late = max(0.0, health['gap_ms']['p95'] - 1000.0 / self.expected_fps)
+            health['delay_ms'] = late + health['convert_ms']['p95']
+
+        if reset:
+            last_receive = self._last_receive
+            self._reset_health()
+            self._last_receive = last_receive
+        return health
             
     def get_frame(self):
-        #if self._frame_available:
-            #self._read_lock.acquire()
-        re, frame = self._cap.retrieve()
-            #self._read_lock.release()
-            #self._frame_available = False
+        """
+        Returns:
+            (Bool, ndarray): True and the newest frame, or False and None if no frame has arrived
+        """
+        re, frame, timestamp, converted, grab_start = self._latest
         return(re, frame)
-        #else:
-            #return(False, None)
+
+    def get_stamped_frame(self):
+        """
+        Returns:
+            (Bool, ndarray, float): As get_frame() plus the time.monotonic() receive time of the frame
+        """
+        re, frame, timestamp, converted, grab_start = self._latest
+        return(re, frame, timestamp)
+
+    def get_traced_frame(self):
+        """
+        Returns:
+            (Bool, ndarray, FrameTrace): As get_frame() plus a trace with the grab, receive and convert stages marked
+        """
+        re, frame, timestamp, converted, grab_start = self._latest
+        trace = FrameTrace(timestamp)
+        if converted is not None:
+            trace.mark('grab', grab_start)
+            trace.mark('convert', converted)
+        return(re, frame, trace)
 
     def __exit__(self, exc_type, exc_value, traceback) :
         self._cap.release()
@@ -0,0 +1,176 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import threading
+import time
+
+
+# Stream settings from lowest to highest quality: (setbitrate, setresolution, setfps)
+QualityLevels = [(1, 'low', 'low'),
+                 (1, 'low', 'middle'),
+                 (2, 'low', 'high'),
+                 (3, 'high', 'middle'),
+                 (4, 'high', 'high'),
+                 (5, 'high', 'high')]
+
+FpsValues = {'high': 30.0, 'middle': 15.0, 'low': 5.0}
+
+
+class StreamQualityController(SingletonConfigurable):
+    """
+    Steps the Tello video settings up or down based on the measured stream health.
+
+    Every interval seconds the StreamCamera health is read. If loss or latency is
+    above target the stream drops one quality level; after upgrade_after good
+    intervals in a row it is raised one level. The interval after a change is
+    skipped so the new settings can settle. set_override() pins a level and
+    pauses the adaptation until clear_override().
+
+    Traitlets:
+        started (Bool): True while the controller is running
+        level (Integer): Index into QualityLevels currently applied
+        override (Integer): Manually pinned level, -1 when adapting
+        interval (Float): Seconds between health checks
+        latency_target (Float): Largest acceptable camera delay in seconds. This is the
+            health delay_ms: late frames (including a decoder falling behind) and the
+            BGR conversion, not the frame interval, so a lower frame rate does not
+            count against it.
+        loss_target (Float): Largest acceptable fraction of lost frames
+        upgrade_after (Integer): Good intervals needed before stepping up
+        initial_level (Integer): Level applied on start
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+    level = traitlets.Integer(default_value=-1, read_only=True)
+    override = traitlets.Integer(default_value=-1, read_only=True)
+
+    interval = traitlets.Float(default_value=2.0).tag(config=True)
+    latency_target = traitlets.Float(default_value=0.1).tag(config=True)
+    loss_target = traitlets.Float(default_value=0.05).tag(config=True)
+    upgrade_after = traitlets.Integer(default_value=3).tag(config=True)
+    initial_level = traitlets.Integer(default_value=4).tag(config=True)
+
+    def __init__(self, tello=None, camera=None, *args, **kwargs):
+        """
+        Parameters:
+            tello (Tello): Drone that receives the setbitrate/setresolution/setfps commands
+            camera (StreamCamera): Provides the stream health measurements
+        """
+        super(StreamQualityController, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+        self.history = [] # (time, level, reason, health) for every change
+
+        # private members
+        self._tello = tello
+        self._camera = camera
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._settings = (None, None, None)
+        self._good_intervals = 0
+        self._settling = False
+
+        atexit.register(self.stop)
+
+    def start(self):
+        if not self.started:
+            self.set_trait('started', True)
+            with self._lock:
+                self._apply(self.initial_level, 'initial', None)
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._adapt, args=(), name='stream-quality')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._stop_event.set()
+            self._thread.join()
+
+    def set_override(self, level):
+        """Applies level and stops adapting until clear_override() is called."""
+        level = max(0, min(len(QualityLevels) - 1, level))
+        with self._lock:
+            self.set_trait('override', level)
+            self._apply(level, 'override', None)
+
+    def clear_override(self):
+        with self._lock:
+            self.set_trait('override', -1)
+            self._good_intervals = 0
+
+    def evaluate(self, health):
+        """
+        Decides the next level from one health measurement.
+
+        Returns:
+            (int, str): New level and the reason, or (current level, None) to stay
+        """
+        latency = health['delay_ms'] / 1000.0 if health['delay_ms'] is not None else None
+        bad = health['loss'] > self.loss_target or (latency is not None and latency > self.latency_target)
+        good = health['loss'] < self.loss_target / 2 and latency is not None and latency < 0.7 * self.latency_target
+
+        if bad:
+            self._good_intervals = 0
+            if self.level > 0:
+                return (self.level - 1, 'degrade')
+        elif good:
+            self._good_intervals += 1
+            if self._good_intervals >= self.upgrade_after and self.level < len(QualityLevels) - 1:
+                self._good_intervals = 0
+                return (self.level + 1, 'upgrade')
+        else:
+            self._good_intervals = 0
+        return (self.level, None)
+
+    def _send_settings(self, level):
+        """
+        Sends the settings of level that the drone does not have yet.
+
+        Only settings the drone acknowledged are recorded, so a lost command is
+        sent again on the next interval.
+
+        Returns:
+            Bool: True if the drone now has all settings of level
+        """
+        settings = list(self._settings)
+        if self._tello is None:
+            settings = list(QualityLevels[level])
+        else:
+            # only send what changed, every command costs a round trip on the command link
+            for index, send in enumerate((self._tello.set_bitrate, self._tello.set_resolution, self._tello.set_fps)):
+                value = QualityLevels[level][index]
+                if value != settings[index] and send(value):
+                    settings[index] = value
+        self._settings = tuple(settings)
+        if self._camera is not None and self._settings[2] is not None:
+            self._camera.expected_fps = FpsValues[self._settings[2]]
+        return self._settings == QualityLevels[level]
+
+    def _apply(self, level, reason, health):
+        self._send_settings(level)
+        self.set_trait('level', level)
+        self._settling = True
+        self.history.append((time.monotonic(), level, reason, health))
+
+    def _step(self):
+        health = self._camera.health(reset=True)
+        with self._lock:
+            if self._settings != QualityLevels[self.level]: # a setting was lost, send it again
+                self._send_settings(self.level)
+                self._settling = True
+                return
+            if self.override >= 0:
+                return
+            if self._settling: # first window after a change is not representative
+                self._settling = False
+                return
+            level, reason = self.evaluate(health)
+            if reason is not None:
+                self._apply(level, reason, health)
+
+    def _adapt(self):
+        while not self._stop_event.wait(self.interval):
+            self._step()
@@ -0,0 +1,117 @@
+import bisect
+import threading
+
+
+# Status fields interpolated to frame timestamps
+FusedFields = ('pitch', 'roll', 'yaw', 'vgx', 'vgy', 'vgz', 'h', 'tof')
+AngleFields = ('pitch', 'roll', 'yaw') # degrees, interpolated the short way around
+
+
+def parse_status(data):
+    """
+    Parses a Tello status string ('pitch:0;roll:0;yaw:0;...;\\r\\n') into a dict of floats.
+
+    Fields that are not numbers (e.g. the mission pad 'mpry:0,0,0') are kept as strings.
+    """
+    status = {}
+    for item in data.strip().split(';'):
+        if ':' not in item:
+            continue
+        key, value = item.split(':', 1)
+        try:
+            status[key] = float(value)
+        except ValueError:
+            status[key] = value
+    return status
+
+
+def angle_difference(a, b):
+    """Returns a - b in degrees, wrapped to -180..180."""
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+class TelemetryFusion(object):
+    """
+    Timestamped history of Tello status samples.
+
+    The status thread adds every packet with its monotonic receive time; the ML
+    thread asks for the drone state at the receive time of a video frame and
+    gets the two neighbouring samples linearly interpolated.
+    """
+
+    def __init__(self, max_samples=200):
+        """
+        Parameters:
+            max_samples (int): Samples kept, the Tello sends about 10 per second
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._times = []
+        self._samples = []
+
+    def add(self, timestamp, status):
+        """
+        Parameters:
+            timestamp (float): time.monotonic() when the packet was received
+            status (str or dict): Raw status string or parse_status() result
+        """
+        if isinstance(status, str):
+            status = parse_status(status)
+        sample = {field: status[field] for field in FusedFields if field in status}
+
+        with self._lock:
+            if self._times and timestamp < self._times[-1]:
+                index = bisect.bisect(self._times, timestamp)
+                self._times.insert(index, timestamp)
+                self._samples.insert(index, sample)
+            else:
+                self._times.append(timestamp)
+                self._samples.append(sample)
+            if len(self._times) > self.max_samples:
+                del self._times[0]
+                del self._samples[0]
+
+    def latest(self):
+        """Returns the newest state, or None if no status has been received."""
+        with self._lock:
+            if not self._times:
+                return None
+            state = dict(self._samples[-1])
+            state['timestamp'] = self._times[-1]
+        state['age'] = 0.0
+        return state
+
+    def at(self, timestamp):
+        """
+        Interpolates the drone state to timestamp.
+
+        Returns:
+            dict: FusedFields plus 'timestamp' and 'age', the distance in seconds to
+            the nearest real sample (large when the frame is outside the history).
+            None if no status has been received.
+        """
+        with self._lock:
+            if not self._times:
+                return None
+            index = bisect.bisect(self._times, timestamp)
+            if index == 0 or index == len(self._times):
+                nearest = 0 if index == 0 else -1
+                state = dict(self._samples[nearest])
+                state['age'] = abs(timestamp - self._times[nearest])
+                state['timestamp'] = timestamp
+                return state
+            t0, t1 = self._times[index - 1], self._times[index]
+            s0, s1 = self._samples[index - 1], self._samples[index]
+
+        w = (timestamp - t0) / (t1 - t0) if t1 > t0 else 0.0
+        state = {}
+        for field in FusedFields:
+            if field not in s0 or field not in s1:
+                continue
+            if field in AngleFields:
+                state[field] = angle_difference(s0[field] + w * angle_difference(s1[field], s0[field]), 0.0)
+            else:
+                state[field] = s0[field] + w * (s1[field] - s0[field])
+        state['timestamp'] = timestamp
+        state['age'] = min(timestamp - t0, t1 - timestamp)
+        return state
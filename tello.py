@@ -2,15 +2,119 @@ import traitlets
 from traitlets.config.configurable import SingletonConfigurable
 import socket
 import atexit
+import collections
+import math
 import threading
 import time
 
+from telemetry import TelemetryFusion
+
 TelloCmdPort = 8889      # Command and response
 TelloStatusPort = 8890   # Status data from the Tello 
 
-Short_Command_Timeout = 0.5
+Short_Command_Timeout = 0.5     # initial timeouts, until response times have been measured
 Long_Command_Timeout = 15.0
 
+Min_Command_Timeout = 0.1       # bounds of the adaptive timeouts
+Max_Short_Command_Timeout = 2.0
+
+# Movement timeouts are the expected flight time plus the learned link timeout, never below Long_Command_Timeout
+Default_Move_Speed = 50.0       # cm/s assumed for up/down/left/right/forward/back until 'speed' is set
+Yaw_Rate = 45.0                 # degrees/second, on the slow side
+Movement_Margin = 1.5           # the drone accelerates, settles and may fly slower than commanded
+
+Status_Poll_Interval = 0.2      # longest wait before the status thread sees close()
+
+# Commands that are safe to send twice. Movement commands must never be duplicated.
+IdempotentCommands = ('command', 'streamon', 'streamoff', 'speed', 'setbitrate', 'setresolution', 'setfps')
+MovementCommands = ('takeoff', 'land', 'up', 'down', 'left', 'right', 'forward', 'back', 'cw', 'ccw',
+                    'go', 'curve', 'flip', 'jump')
+
+
+def command_class(command):
+    """
+    Groups commands with similar response times.
+
+    Returns:
+        str: 'query' for '?' reads, the command name for movement (each takes its own
+        time to fly) and 'control' for everything else
+    """
+    name = command.split(' ')[0]
+    if name.endswith('?'):
+        return 'query'
+    if name in MovementCommands:
+        return name
+    return 'control'
+
+
+def is_idempotent(command):
+    name = command.split(' ')[0]
+    return name.endswith('?') or name in IdempotentCommands
+
+
+def flight_duration(command, move_speed=Default_Move_Speed):
+    """
+    Seconds a movement command is expected to fly, from its distance and speed.
+
+    Parameters:
+        command (str): Movement command, e.g. 'go 300 0 0 10'
+        move_speed (float): cm/s the drone is set to, used by the single axis moves
+
+    Returns:
+        float: Expected flight time, 0.0 for commands without a distance (takeoff, land, flip)
+    """
+    words = command.split(' ')
+    name = words[0]
+    try:
+        values = [float(word) for word in words[1:]]
+    except ValueError:
+        return 0.0
+    if name in ('up', 'down', 'left', 'right', 'forward', 'back') and values:
+        return abs(values[0]) / move_speed
+    if name in ('cw', 'ccw') and values:
+        return abs(values[0]) / Yaw_Rate
+    if name == 'go' and len(values) == 4 and values[3] > 0:
+        return math.sqrt(sum(v * v for v in values[:3])) / values[3]
+    if name == 'curve' and len(values) == 7 and values[6] > 0:
+        x1, y1, z1, x2, y2, z2, speed = values
+        # the two chords through the middle point, an arc is at most pi/2 times longer
+        chords = math.sqrt(x1 * x1 + y1 * y1 + z1 * z1) + math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2 + (z2 - z1) ** 2)
+        return chords * math.pi / 2.0 / speed
+    return 0.0
+
+
+class RTTEstimator(object):
+    """
+    Smoothed round trip time and variance as used by TCP (RFC 6298).
+
+    timeout() is srtt + k * rttvar, clamped to [min_timeout, max_timeout], or the
+    initial timeout until the first sample.
+    """
+
+    def __init__(self, initial_timeout, min_timeout, max_timeout, alpha=0.125, beta=0.25, k=4.0):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self.srtt = None
+        self.rttvar = None
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = (1.0 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+            self.srtt = (1.0 - self.alpha) * self.srtt + self.alpha * rtt
+
+    def timeout(self):
+        if self.srtt is None:
+            return self.initial_timeout
+        return max(self.min_timeout, min(self.max_timeout, self.srtt + self.k * self.rttvar))
+
+
 class Tello(SingletonConfigurable):
     """
     Interface class for single Tello drone.
@@ -23,12 +127,16 @@ class Tello(SingletonConfigurable):
     
     Public Attributes:
             is_flying (Bool): True if Takeoff successful, False if Land successful
+            status_timestamp (float): time.monotonic() when status_data was received
+            telemetry (TelemetryFusion): Timestamped status history for fusion with video frames
     """
 
     command_link_status = traitlets.Bool(default_value=False, read_only=True)
     status_link_status = traitlets.Bool(default_value=False, read_only=True)
     status_data = traitlets.Unicode(default_value=None, read_only=False)
     response = traitlets.Unicode(default_value=None, read_only=False)
+
+    max_retransmits = traitlets.Integer(default_value=2).tag(config=True) # extra sends of idempotent commands
     
     def __init__(self, tello_ip, local_ip, *args, **kwargs):
         """
@@ -45,40 +153,86 @@ class Tello(SingletonConfigurable):
         self.status_data = ''
         self.response = '' 
         self.is_flying = False
+        self.status_timestamp = None
+        self.telemetry = TelemetryFusion()
         
         self._last_height = 0
         self._tello_ip = tello_ip
+        self._local_ip = local_ip
         #self._command_response = ''
         #self._error_response = ''
         self._command_abort_flag = False
+        self._rtt_estimators = {'control': RTTEstimator(Short_Command_Timeout, Min_Command_Timeout, Max_Short_Command_Timeout),
+                                'query': RTTEstimator(Short_Command_Timeout, Min_Command_Timeout, Max_Short_Command_Timeout)}
+        self._move_speed = Default_Move_Speed
+        self._command_lock = threading.Lock()
+        self._command_stats = collections.defaultdict(lambda: dict(sent=0, succeeded=0, failed=0, retransmits=0, timeout=None,
+                                                                   response_times=collections.deque(maxlen=500)))
         #self._command_timeout = command_timeout
+        self._status_stop = threading.Event()
+        self._cmd_socket = None
+        self._status_socket = None
+        self._status_thread = None
+
+        self._open()
+        atexit.register(self.close)
 
+    def _open(self):
+        """Binds the command and status sockets and starts the status thread."""
         # create a socket and thread for sending and receiving commands
         self._cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # socket for sending / receiving commands
-        self._cmd_socket.bind((local_ip, TelloCmdPort))
+        self._cmd_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # rebind right after close()
+        self._cmd_socket.bind((self._local_ip, TelloCmdPort))
         self._cmd_socket.setblocking(True)
         
         # create a socket and thread for receiving status stream
         self._status_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # socket for receiving status stream
-        self._status_socket.bind((local_ip, TelloStatusPort))
-        self._status_thread = threading.Thread(target=self._receive_status)
+        self._status_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._status_socket.bind((self._local_ip, TelloStatusPort))
+        self._status_socket.settimeout(Status_Poll_Interval) # so the thread notices close()
+        self._status_stop.clear()
+        self._status_thread = threading.Thread(target=self._receive_status, name='tello-status')
         self._status_thread.daemon = True
         self._status_thread.start()
 
+    def close(self):
+        """Stops the status thread and closes the sockets. reconnect() opens them again."""
+        if getattr(self, '_status_thread', None) is None: # never opened or already closed
+            return
+        self._status_stop.set()
+        self._status_thread.join()
+        self._status_thread = None
+        self._cmd_socket.close()
+        self._status_socket.close()
+        self.set_trait('command_link_status', False)
+        self.set_trait('status_link_status', False)
+
+    def reconnect(self):
+        """
+        Rebinds the sockets and re-enters command mode, e.g. after the Wi-Fi link dropped.
+
+        Returns:
+            Bool: True if the Tello answered the 'command' command
+        """
+        self.close()
+        self._open()
+        return self.command()
 
     def __del__(self):
         """Closes sockets and stops threads."""
-        self._cmd_socket.close()
-        self._status_socket.close()
-        # ToDo stop all threads
+        self.close()
 
-    def send_command(self, command, timeout):
+    def send_command(self, command, timeout=None, retransmits=None):
         """
-        Send a command to the Tello and wait timeout seconds for each of up to two responses.
+        Send a command to the Tello and wait for up to two responses.
 
         Parameters:
             command (str): Command to send
-            timeout (float): Seconds to wait for a command response
+            timeout (float): Seconds to wait for a command response. Default is the
+                adaptive timeout learned from the link round trip time, plus the
+                expected flight time for movement commands.
+            retransmits (int): Extra sends of an idempotent command without a response.
+                Default max_retransmits, 0 sends once. Never applied to other commands.
 
         Returns:
             Bool: True if command executed, False if command or communication error
@@ -92,66 +246,180 @@ class Tello(SingletonConfigurable):
             immediate data (no 'ok', but trailing \r\n in some cases)
             delayed 'ok' on task completion
             nothing at all ( the rc command )
+
+        Idempotent commands (see IdempotentCommands and the '?' queries) are sent
+        again, up to max_retransmits times, when no response arrives in time. Any
+        other command, in particular movement, is only ever sent once.
+
+        Commands from different threads are sent one at a time: responses carry
+        no id, so a second command in flight could take the first one's answer.
         """
+        with self._command_lock:
+            return self._send_command(command, timeout, retransmits)
 
+    def _send_command(self, command, timeout, retransmits):
         rc = False
+        kind = command_class(command)
+        estimator = self._rtt_estimators.get(kind) # None for movement, its response time is mostly flying
+        stats = self._command_stats[kind]
+        if timeout is None:
+            timeout = self.command_timeout(command)
+        stats['timeout'] = timeout
+        if retransmits is None:
+            retransmits = self.max_retransmits
+        if not is_idempotent(command):
+            retransmits = 0
         
         print (">> send cmd: {}".format(command))
-        try:
-            self._cmd_socket.settimeout(Short_Command_Timeout)
-            self._cmd_socket.sendto(command.encode('utf-8'), (self._tello_ip, TelloCmdPort))
+        self._drain_responses() # a late answer to an earlier command must not be taken for this one
+        start = time.monotonic()
+        stats['sent'] += 1
+
+        for attempt in range(retransmits + 1):
+            try:
+                self._cmd_socket.settimeout(Short_Command_Timeout)
+                self._cmd_socket.sendto(command.encode('utf-8'), (self._tello_ip, TelloCmdPort))
+            
+            except (socket.error, OSError) as msg:
+                self.set_trait('command_link_status', False)
+                self.response = 'WARNING: Error on send!! ' + repr(msg)
+                break
         
-        except (socket.error, OSError) as msg:
-            self.set_trait('command_link_status', False)
-            self.response = 'WARNING: Error on send!! ' + repr(msg)
-    
-        else: # command sent, so wait for a response
+            # command sent, so wait for a response
+            sent = time.monotonic()
+            if attempt:
+                stats['retransmits'] += 1
             try:
                 self._cmd_socket.settimeout(timeout)
                 response, ip = self._cmd_socket.recvfrom(1518) # 1518 in other sample code...
                 print(response)
+
+            except socket.timeout as msg:
+                self.set_trait('command_link_status', False)
+                self.response = 'WARNING: Error on recv!! ' + repr(msg)
+                if estimator is not None:
+                    timeout = min(2 * timeout, estimator.max_timeout) # back off before trying again
+                continue
  
             except OSError as msg:
                 self.set_trait('command_link_status', False)
                 self.response = 'WARNING: Error on recv!! ' + repr(msg)
+                break
             
-            else: # received some response from Tello...
-                
-                self.response = response.decode(encoding='utf-8') # converts a byte array to a string 
-                self.set_trait('command_link_status', True)
+            # received some response from Tello...
+            received = time.monotonic()
+            if attempt == 0 and estimator is not None:
+                estimator.sample(received - sent) # after a retransmission it is unknown which send was answered
+            stats['response_times'].append(received - start)
+            
+            self.response = response.decode(encoding='utf-8') # converts a byte array to a string 
+            self.set_trait('command_link_status', True)
 
-                if not response == b'error':
-                    rc = True # not an error, so return True            
-                
-                # listen for a possible second response string
-                try:
-                    self._cmd_socket.settimeout(Short_Command_Timeout)
-                    response, ip = self._cmd_socket.recvfrom(1518) # 1518 in other sample code...
-                    print(response)
-                    
-                except socket.timeout: pass # maybe no seconds response, so timeout exception is ok
-                except OSError as msg:
-                    self.response += 'WARNING: Error on recv!! ' + repr(msg)
+            if not response == b'error':
+                rc = True # not an error, so return True            
+                if command.startswith('speed '):
+                    self._move_speed = float(command.split(' ')[1])
             
-                else: # received a second response from Tello, so append it
-                    self.response += ' ' + response.decode(encoding='utf-8') # converts a byte array to a string
+            # listen for a possible second response string
+            try:
+                self._cmd_socket.settimeout(min(Short_Command_Timeout, self._rtt_estimators['control'].timeout()))
+                response, ip = self._cmd_socket.recvfrom(1518) # 1518 in other sample code...
+                print(response)
+                
+            except socket.timeout: pass # maybe no seconds response, so timeout exception is ok
+            except OSError as msg:
+                self.response += 'WARNING: Error on recv!! ' + repr(msg)
         
+            else: # received a second response from Tello, so append it
+                self.response += ' ' + response.decode(encoding='utf-8') # converts a byte array to a string
+            break
+
+        stats['succeeded' if rc else 'failed'] += 1
         return rc
+
+    def _drain_responses(self):
+        """Discards responses that arrived after their command timed out."""
+        # non-blocking, MSG_DONTWAIT alone still waits out the timeout the last command left on the socket
+        timeout = self._cmd_socket.gettimeout()
+        try:
+            self._cmd_socket.settimeout(0.0)
+            while True:
+                self._cmd_socket.recvfrom(1518)
+        except OSError: # BlockingIOError once empty
+            pass
+        finally:
+            if self._cmd_socket.fileno() != -1: # not closed meanwhile
+                self._cmd_socket.settimeout(timeout)
+
+    def command_timeout(self, command):
+        """
+        Seconds send_command waits for the response to command.
+
+        Control commands and queries wait the adaptive timeout learned from their
+        round trip times. Movement waits its expected flight time (with
+        Movement_Margin) plus the control timeout, and at least Long_Command_Timeout.
+        """
+        kind = command_class(command)
+        if kind in self._rtt_estimators:
+            return self._rtt_estimators[kind].timeout()
+        flight = Movement_Margin * flight_duration(command, self._move_speed)
+        return max(Long_Command_Timeout, flight + self._rtt_estimators['control'].timeout())
+
+    def command_stats(self):
+        """
+        Reports command link performance for each kind of command.
+
+        Returns:
+            dict: Per command class ('control', 'query' or the movement command name):
+                  sent, succeeded, failed, retransmits, success_rate,
+                  srtt_ms, rttvar_ms (control and query only, None for movement),
+                  timeout_ms (timeout of the last command of the class),
+                  response_ms (p50, p95, max time from first send to response)
+        """
+        report = {}
+        for kind, stats in self._command_stats.items():
+            estimator = self._rtt_estimators.get(kind)
+            srtt = estimator.srtt if estimator is not None else None
+            rttvar = estimator.rttvar if estimator is not None else None
+            times = sorted(stats['response_times'])
+            entry = dict(sent=stats['sent'],
+                         succeeded=stats['succeeded'],
+                         failed=stats['failed'],
+                         retransmits=stats['retransmits'],
+                         success_rate=stats['succeeded'] / stats['sent'] if stats['sent'] else None,
+                         srtt_ms=srtt * 1000.0 if srtt is not None else None,
+                         rttvar_ms=rttvar * 1000.0 if rttvar is not None else None,
+                         timeout_ms=stats['timeout'] * 1000.0,
+                         response_ms=None)
+            if times:
+                entry['response_ms'] = dict(p50=times[len(times) // 2] * 1000.0,
+                                            p95=times[min(len(times) - 1, int(0.95 * len(times)))] * 1000.0,
+                                            max=times[-1] * 1000.0)
+            report[kind] = entry
+        return report
         
     def _receive_status(self):
         """  Private Member!!
         Listen to status packets from the Tello.
 
-        Runs as a thread, sets self.status to whatever the Tello last returned.
+        Runs as a thread, sets self.status to whatever the Tello last returned
+        and records it with its receive time in self.telemetry.
         """
-        while True:
+        while not self._status_stop.is_set():
             try:
                 response, ip = self._status_socket.recvfrom(1518) # 1518 in other sample code...
+            except socket.timeout:
+                continue
             except OSError as msg:
                 print ("Caught exception socket.error : %s" % repr(msg))
                 self.set_trait('status_link_status', False)
+                self._status_stop.wait(Status_Poll_Interval) # don't spin while the network is down
             else:
-                self.status_data = response.decode(encoding='utf-8') # converts a byte array to a string 
+                timestamp = time.monotonic() # stamp before decoding so the time is as close to arrival as possible
+                status = response.decode(encoding='utf-8') # converts a byte array to a string 
+                self.telemetry.add(timestamp, status)
+                self.status_timestamp = timestamp
+                self.status_data = status
                 self.set_trait('status_link_status', True)
 
     def command(self):
@@ -162,7 +430,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('command', Short_Command_Timeout)
+        return self.send_command('command')
 
     def rc(self, a=0, b=0, c=0, d=0):
         """
@@ -187,9 +455,9 @@ class Tello(SingletonConfigurable):
         rc = True
         command = 'rc %s %s %s %s' % (a, b, c, d)
         
-        print (">> send cmd: {}".format(command))
+        # not printed, the visual servo sends it 20 times a second. No settimeout() either,
+        # rc doesn't take the command lock and must not change the timeout of a command in flight
         try:
-            self._cmd_socket.settimeout(Short_Command_Timeout)
             self._cmd_socket.sendto(command.encode('utf-8'), (self._tello_ip, TelloCmdPort))
         
         except (socket.error, OSError) as msg:
@@ -209,7 +477,7 @@ class Tello(SingletonConfigurable):
         """
         rc = False
         if not self.is_flying:
-            rc = self.send_command('takeoff', Long_Command_Timeout)
+            rc = self.send_command('takeoff')
             if rc:
                 self.is_flying = True
         
@@ -228,7 +496,7 @@ class Tello(SingletonConfigurable):
         """
         rc = False
         if self.is_flying:
-            rc = self.send_command('land', Long_Command_Timeout)
+            rc = self.send_command('land')
             if rc:
                 self.is_flying = False
         
@@ -245,7 +513,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('streamon', Short_Command_Timeout)
+        return self.send_command('streamon')
 
     def streamoff(self):
         """
@@ -255,7 +523,46 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('streamoff', Short_Command_Timeout)
+        return self.send_command('streamoff')
+
+    def set_bitrate(self, bitrate):
+        """
+        Sets the video stream bitrate.
+
+        Parameters:
+            bitrate (int): 0 auto, 1 to 5 Mbps
+
+        Returns:
+            Bool: True if successful, False if error
+            Sets self.response
+        """
+        return self.send_command('setbitrate %s' % bitrate)
+
+    def set_resolution(self, resolution):
+        """
+        Sets the video stream resolution.
+
+        Parameters:
+            resolution (str): 'high' (720p) or 'low' (480p)
+
+        Returns:
+            Bool: True if successful, False if error
+            Sets self.response
+        """
+        return self.send_command('setresolution %s' % resolution)
+
+    def set_fps(self, fps):
+        """
+        Sets the video stream frame rate.
+
+        Parameters:
+            fps (str): 'high' (30), 'middle' (15) or 'low' (5)
+
+        Returns:
+            Bool: True if successful, False if error
+            Sets self.response
+        """
+        return self.send_command('setfps %s' % fps)
 
     def emergency(self):
         """
@@ -264,8 +571,25 @@ class Tello(SingletonConfigurable):
         Returns:
             Bool: True if successful, False if error
             Sets self.response
+
+        Note: Does not wait for a command in flight (e.g. a long movement). In
+        that case the datagram is sent right away and True means it was sent.
         """
-        return self.send_command('emergency', Short_Command_Timeout)
+        return self._send_urgent('emergency')
+
+    def _send_urgent(self, command):
+        """Sends command normally if no other command is in flight, otherwise sends it right away without waiting."""
+        if self._command_lock.acquire(blocking=False):
+            try:
+                return self._send_command(command, None, None)
+            finally:
+                self._command_lock.release()
+        try:
+            self._cmd_socket.sendto(command.encode('utf-8'), (self._tello_ip, TelloCmdPort))
+        except OSError as msg:
+            self.response = 'WARNING: Error on send!! ' + repr(msg)
+            return False
+        return True
 
     def stop(self):
         """
@@ -274,8 +598,10 @@ class Tello(SingletonConfigurable):
         Returns:
             Bool: True if successful, False if error
             Sets self.response
+
+        Note: Like emergency(), does not wait for a command in flight.
         """
-        return self.send_command('stop', Short_Command_Timeout)
+        return self._send_urgent('stop')
 
 
     def up(self, x):
@@ -289,7 +615,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('up %s' % x, Long_Command_Timeout)
+        return self.send_command('up %s' % x)
     
     def down(self, x):
         """
@@ -302,7 +628,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('down %s' % x, Long_Command_Timeout)
+        return self.send_command('down %s' % x)
     
     def left(self, x):
         """
@@ -315,7 +641,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('left %s' % x, Long_Command_Timeout)
+        return self.send_command('left %s' % x)
     
     def right(self, x):
         """
@@ -328,7 +654,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('right %s' % x, Long_Command_Timeout)
+        return self.send_command('right %s' % x)
     
     def forward(self, x):
         """
@@ -341,7 +667,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('forward %s' % x, Long_Command_Timeout)
+        return self.send_command('forward %s' % x)
     
     def back(self, x):
         """
@@ -354,7 +680,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('back %s' % x, Long_Command_Timeout)
+        return self.send_command('back %s' % x)
     
     def cw(self, x):
         """
@@ -367,7 +693,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('cw %s' % x, Long_Command_Timeout)
+        return self.send_command('cw %s' % x)
     
     def ccw(self, x):
         """
@@ -380,7 +706,7 @@ class Tello(SingletonConfigurable):
             Bool: True if successful, False if error
             Sets self.response
         """
-        return self.send_command('ccw %s' % x, Long_Command_Timeout)
+        return self.send_command('ccw %s' % x)
         
     def go(self, x, y, z, speed):
         """
@@ -398,7 +724,25 @@ class Tello(SingletonConfigurable):
 
         Note: “x”, “y”, and “z” values can’t be set between -20 – 20 simultaneously.
         """
-        return self.send_command('go %s %s %s %s' % (x, y, z, speed), Long_Command_Timeout)
+        return self.send_command('go %s %s %s %s' % (x, y, z, speed))
+
+    def curve(self, x1, y1, z1, x2, y2, z2, speed):
+        """
+        Fly along an arc through x1 y1 z1 to x2 y2 z2 at speed(cm/s).
+
+        Parameters:
+            x1, y1, z1 (int): -500 to 500 point on the arc in cm
+            x2, y2, z2 (int): -500 to 500 end of the arc in cm
+            speed (int): 10 to 60 cm/s
+
+        Returns:
+            Bool: True if successful, False if error
+            Sets self.response
+
+        Note: The arc radius must be 50 to 1000 cm. “x”, “y”, and “z” of either
+        point can’t be set between -20 – 20 simultaneously.
+        """
+        return self.send_command('curve %s %s %s %s %s %s %s' % (x1, y1, z1, x2, y2, z2, speed))
     
     
     
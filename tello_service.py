@@ -0,0 +1,504 @@
+"""
+Headless Tello service: runs the drone, video and ML pipeline without Jupyter.
+
+    python tello_service.py --config tello_service.json
+
+Endpoints (localhost by default):
+    GET /            minimal viewer page
+    GET /video.mjpg  annotated video as MJPEG
+    GET /ws          WebSocket: telemetry pushed as JSON, commands accepted as JSON or plain SDK strings
+
+The config file is a traitlets JSON config, one section per class, e.g.
+    {"TelloService": {"port": 8080}, "OverlayRenderer": {"fps": 20}, "VisualServoController": {"rate": 20}}
+"""
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+from traitlets.config.loader import JSONFileConfigLoader, Config
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import atexit
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlsplit
+
+from tello import Tello
+from stream_camera import StreamCamera
+from ml_process import MLProcess
+from overlay import OverlayRenderer
+from frame_trace import TraceCollector
+from telemetry import parse_status
+from visual_servo import VisualServoController
+from stream_quality import StreamQualityController
+from link_manager import LinkManager
+from profiler import SamplingProfiler, thread_cpu_usage
+
+
+WebSocketGUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MJPEGBoundary = 'frame'
+
+
+class FrameBroadcaster(object):
+    """
+    Hands the newest JPEG to any number of viewers.
+
+    Every frame is encoded once by the renderer; viewers block in wait() until a
+    newer version than the one they sent last is available. The renderer is only
+    running while at least one viewer is connected.
+    """
+
+    def __init__(self, renderer):
+        self._renderer = renderer
+        self._condition = threading.Condition()
+        self._jpeg = None
+        self._version = 0
+        self._viewers = 0
+        self._viewers_lock = threading.Lock()
+        renderer.encode_jpeg = True
+        renderer.observe(self._jpeg_changed, names='jpeg')
+
+    @property
+    def viewers(self):
+        return self._viewers
+
+    def _jpeg_changed(self, change):
+        with self._condition:
+            self._jpeg = change['new']
+            self._version += 1
+            self._condition.notify_all()
+
+    def connect(self):
+        with self._viewers_lock:
+            self._viewers += 1
+            if self._viewers == 1:
+                self._renderer.start()
+
+    def disconnect(self):
+        # start and stop under the same lock, so a viewer connecting while the
+        # last one leaves can't be left with a stopped renderer. Not _condition:
+        # stop() joins the render thread, which takes _condition to publish a frame.
+        with self._viewers_lock:
+            self._viewers -= 1
+            if self._viewers == 0:
+                self._renderer.stop()
+
+    def wait(self, version, timeout=1.0):
+        """
+        Returns:
+            (int, bytes): Newest version and JPEG, or (version, None) on timeout
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._version != version, timeout):
+                return (version, None)
+            return (self._version, self._jpeg)
+
+
+class WebSocket(object):
+    """Minimal RFC 6455 server side connection, text messages only."""
+
+    def __init__(self, rfile, wfile):
+        self._rfile = rfile
+        self._wfile = wfile
+        self._write_lock = threading.Lock()
+        self.closed = False
+
+    @staticmethod
+    def accept_key(key):
+        digest = hashlib.sha1((key + WebSocketGUID).encode('ascii')).digest()
+        return base64.b64encode(digest).decode('ascii')
+
+    def _read_exact(self, count):
+        data = self._rfile.read(count)
+        if data is None or len(data) < count:
+            raise ConnectionError('WebSocket closed')
+        return data
+
+    def receive(self):
+        """
+        Returns:
+            str: Next text message, or None when the connection is closed
+        """
+        message = b''
+        while not self.closed:
+            head, length = struct.unpack('!BB', self._read_exact(2))
+            opcode = head & 0x0F
+            masked = length & 0x80
+            length &= 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', self._read_exact(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', self._read_exact(8))
+            mask = self._read_exact(4) if masked else b'\x00' * 4
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._read_exact(length)))
+
+            if opcode == 0x8: # close
+                self._send_frame(0x8, payload[:2])
+                self.closed = True
+                return None
+            elif opcode == 0x9: # ping
+                self._send_frame(0xA, payload)
+            elif opcode in (0x0, 0x1):
+                message += payload
+                if head & 0x80: # final fragment
+                    return message.decode('utf-8')
+        return None
+
+    def send(self, text):
+        self._send_frame(0x1, text.encode('utf-8'))
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        with self._write_lock:
+            self._wfile.write(header + payload)
+            self._wfile.flush()
+
+
+ViewerPage = """<!DOCTYPE html>
+<html><head><title>Tello</title></head>
+<body style="font-family: monospace">
+<img src="/video.mjpg"><br>
+<input id="cmd" size="40" placeholder="command takeoff land forward 50 ..."><pre id="out"></pre><pre id="status"></pre>
+<script>
+var ws = new WebSocket('ws://' + location.host + '/ws');
+ws.onmessage = function (e) {
+  var msg = JSON.parse(e.data);
+  if (msg.type == 'telemetry') document.getElementById('status').textContent = JSON.stringify(msg, null, 1);
+  else document.getElementById('out').textContent = JSON.stringify(msg);
+};
+document.getElementById('cmd').onkeydown = function (e) {
+  if (e.key == 'Enter') { ws.send(this.value); this.value = ''; }
+};
+</script></body></html>
+"""
+
+
+class TelloServiceHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass # keep the console for command output
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/video.mjpg':
+            self._stream_video()
+        elif path == '/ws' and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self._websocket()
+        elif path == '/':
+            body = ViewerPage.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _stream_video(self):
+        broadcaster = self.server.service.broadcaster
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + MJPEGBoundary)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        broadcaster.connect()
+        try:
+            version = 0
+            while self.server.service.started:
+                version, jpeg = broadcaster.wait(version)
+                if jpeg is None:
+                    continue
+                self.wfile.write(('--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+                                  % (MJPEGBoundary, len(jpeg))).encode('ascii'))
+                self.wfile.write(jpeg)
+                self.wfile.write(b'\r\n')
+        except (ConnectionError, socket.error):
+            pass # viewer went away
+        finally:
+            broadcaster.disconnect()
+
+    def _same_origin(self):
+        """
+        Browsers send the page origin with every WebSocket upgrade, and any page can open one to localhost.
+        Only the page served here may connect; clients that send no Origin are not browsers and are let through.
+        """
+        origin = self.headers.get('Origin')
+        if origin is None:
+            return True
+        return urlsplit(origin).netloc.lower() == self.headers.get('Host', '').lower()
+
+    def _websocket(self):
+        service = self.server.service
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key:
+            self.send_error(400, 'Sec-WebSocket-Key missing')
+            return
+        if not self._same_origin():
+            self.send_error(403, 'Cross origin WebSocket')
+            return
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', WebSocket.accept_key(key))
+        self.end_headers()
+        self.close_connection = True
+
+        ws = WebSocket(self.rfile, self.wfile)
+        sender = threading.Thread(target=self._push_telemetry, args=(ws,), name='ws-telemetry')
+        sender.daemon = True
+        sender.start()
+        try:
+            while service.started:
+                message = ws.receive()
+                if message is None:
+                    break
+                ws.send(json.dumps(service.handle_message(message)))
+        except (ConnectionError, socket.error, ValueError):
+            pass
+        finally:
+            ws.closed = True
+
+    def _push_telemetry(self, ws):
+        service = self.server.service
+        try:
+            while not ws.closed and service.started:
+                ws.send(json.dumps(service.telemetry_message()))
+                time.sleep(1.0 / service.telemetry_rate)
+        except (ConnectionError, socket.error, ValueError):
+            ws.closed = True
+
+
+class TelloService(SingletonConfigurable):
+    """
+    Wires Tello, StreamCamera, MLProcess and OverlayRenderer together and serves them over HTTP.
+
+    Traitlets:
+        started (Bool): True while serving
+        tello_ip, local_ip (Unicode): Passed to Tello
+        host, port: HTTP listen address, localhost only by default
+        telemetry_rate (Float): WebSocket telemetry messages per second
+        detections_active (Bool), target_selection (Integer): Initial MLProcess settings
+        cpu_model (Unicode): ONNX model for CPUObjectDetector, empty to use the TensorRT engine
+        cpu_precision (Unicode): 'fp32', 'fp16' or 'int8' for cpu_model
+        adaptive_stream (Bool): Run the StreamQualityController
+        auto_reconnect (Bool): Run the LinkManager, reconnecting when status or video stops
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+
+    tello_ip = traitlets.Unicode(default_value='192.168.10.1').tag(config=True)
+    local_ip = traitlets.Unicode(default_value='192.168.10.2').tag(config=True)
+    host = traitlets.Unicode(default_value='127.0.0.1').tag(config=True)
+    port = traitlets.Integer(default_value=8080).tag(config=True)
+    telemetry_rate = traitlets.Float(default_value=5.0).tag(config=True)
+    detections_active = traitlets.Bool(default_value=False).tag(config=True)
+    target_selection = traitlets.Integer(default_value=-1).tag(config=True)
+    cpu_model = traitlets.Unicode(default_value='').tag(config=True)
+    cpu_precision = traitlets.Unicode(default_value='fp32').tag(config=True)
+    adaptive_stream = traitlets.Bool(default_value=False).tag(config=True)
+    auto_reconnect = traitlets.Bool(default_value=True).tag(config=True)
+
+    def __init__(self, *args, **kwargs):
+        super(TelloService, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+        self.tello = None
+        self.camera = None
+        self.controller = None
+        self.mlp = None
+        self.renderer = None
+        self.stream_quality = None
+        self.link_manager = None
+        self.broadcaster = None
+        self._server = None
+        self._server_thread = None
+
+        atexit.register(self.stop)
+
+    def _build(self):
+        # create the shared singletons first, so they also pick up the config file
+        TraceCollector.instance(config=self.config)
+        SamplingProfiler.instance(config=self.config)
+
+        self.tello = Tello.instance(tello_ip=self.tello_ip, local_ip=self.local_ip, config=self.config)
+        self.controller = VisualServoController(tello=self.tello, config=self.config)
+        self.tello.command()
+        self.tello.streamon()
+
+        self.camera = StreamCamera.instance(config=self.config)
+        self.camera.start()
+
+        if self.adaptive_stream:
+            self.stream_quality = StreamQualityController.instance(tello=self.tello, camera=self.camera, config=self.config)
+            self.stream_quality.start()
+
+        model = None
+        if self.cpu_model:
+            from cpu_object_detection import CPUObjectDetector # only needed off the Jetson
+            model = CPUObjectDetector(self.cpu_model, self.cpu_precision)
+        self.mlp = MLProcess.instance(tello=self.tello, camera=self.camera, model=model,
+                                      controller=self.controller, config=self.config)
+        self.mlp.detections_active = self.detections_active
+        self.mlp.target_selection = self.target_selection
+        self.mlp.start()
+
+        if self.auto_reconnect:
+            self.link_manager = LinkManager.instance(tello=self.tello, camera=self.camera, mlp=self.mlp, config=self.config)
+            self.link_manager.start()
+
+        self.renderer = OverlayRenderer.instance(camera=self.camera, overlay=self.mlp.overlay, config=self.config)
+        self.broadcaster = FrameBroadcaster(self.renderer)
+
+    def start(self):
+        if not self.started:
+            if self.tello is None:
+                self._build()
+            self._server = ThreadingHTTPServer((self.host, self.port), TelloServiceHandler)
+            self._server.daemon_threads = True
+            self._server.service = self
+            self.set_trait('started', True)
+            self._server_thread = threading.Thread(target=self._server.serve_forever, args=(), name='http-server')
+            self._server_thread.daemon = True
+            self._server_thread.start()
+            print('serving on http://%s:%d/' % (self.host, self.port))
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._server.shutdown()
+            self._server.server_close()
+            self._server_thread.join()
+            if self.link_manager is not None:
+                self.link_manager.stop()
+            self.renderer.stop()
+            self.mlp.stop()
+            if self.stream_quality is not None:
+                self.stream_quality.stop()
+            self.camera.stop()
+
+    def telemetry_message(self):
+        return dict(type='telemetry',
+                    time=time.monotonic(),
+                    command_link=self.tello.command_link_status,
+                    status_link=self.tello.status_link_status,
+                    is_flying=self.tello.is_flying,
+                    status=parse_status(self.tello.status_data) if self.tello.status_data else {},
+                    detections_active=self.mlp.detections_active,
+                    tracking_active=self.mlp.tracking_active,
+                    target_selection=self.mlp.target_selection,
+                    detections=len(self.mlp.filtered_detections),
+                    detector=self.mlp.gate.stats(),
+                    viewers=self.broadcaster.viewers,
+                    stream_level=self.stream_quality.level if self.stream_quality is not None else None,
+                    link_up=self.link_manager.link_up if self.link_manager is not None else None,
+                    pipeline=TraceCollector.instance().stage_percentiles())
+
+    def handle_message(self, message):
+        """
+        Executes a WebSocket message.
+
+        Parameters:
+            message (str): Either a plain SDK command ('takeoff', 'forward 50') or JSON:
+                {"command": "..."} and/or {"detections_active": bool, "tracking_active": bool,
+                "target_selection": int, "stream_level": int or null to resume adapting,
+                "thread_cpu": seconds to measure per-thread CPU usage over,
+                "profile": seconds to sample all thread stacks, written to the profiler output_dir}
+
+        Returns:
+            dict: Reply sent back to the client
+        """
+        try:
+            request = json.loads(message)
+        except ValueError:
+            request = dict(command=message)
+        if not isinstance(request, dict):
+            request = dict(command=str(request))
+
+        reply = dict(type='reply')
+        for name in ('detections_active', 'tracking_active', 'target_selection'):
+            if name in request:
+                setattr(self.mlp, name, request[name])
+                reply[name] = request[name]
+
+        if 'stream_level' in request and self.stream_quality is not None:
+            if request['stream_level'] is None:
+                self.stream_quality.clear_override()
+            else:
+                self.stream_quality.set_override(int(request['stream_level']))
+            reply['stream_level'] = request['stream_level']
+
+        if 'thread_cpu' in request:
+            reply['thread_cpu'] = thread_cpu_usage(float(request['thread_cpu']))
+
+        if 'profile' in request:
+            profiler = SamplingProfiler.instance()
+            if profiler.started:
+                reply['profile'] = 'busy'
+            else:
+                name = time.strftime('profile-%Y%m%d-%H%M%S.collapsed')
+                worker = threading.Thread(target=profiler.profile, args=(float(request['profile']), name), name='profile-request')
+                worker.daemon = True
+                worker.start()
+                reply['profile'] = os.path.join(profiler.output_dir, name)
+
+        command = request.get('command', '').strip()
+        if command:
+            if command == 'takeoff':
+                ok = self.tello.takeoff()
+            elif command == 'land':
+                ok = self.tello.land()
+            elif command in ('emergency', 'stop'):
+                ok = getattr(self.tello, command)() # must not queue behind a movement in flight
+            elif command.startswith('rc '):
+                ok = self.tello.rc(*command.split()[1:])
+            else:
+                ok = self.tello.send_command(command) # movement waits its expected flight time
+            reply.update(command=command, ok=ok, response=self.tello.response)
+        return reply
+
+
+def load_config(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return JSONFileConfigLoader(name, directory).load_config()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=None, help='traitlets JSON config file')
+    parser.add_argument('--host', default=None, help='override TelloService.host')
+    parser.add_argument('--port', type=int, default=None, help='override TelloService.port')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config) if args.config else Config()
+    if args.host is not None:
+        config.TelloService.host = args.host
+    if args.port is not None:
+        config.TelloService.port = args.port
+
+    service = TelloService.instance(config=config)
+    service.start()
+    try:
+        while service.started:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
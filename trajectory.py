@@ -0,0 +1,302 @@
+import collections
+import math
+
+from telemetry import angle_difference
+
+
+# Tello SDK limits, distances in cm
+Go_Range = 500              # per axis for go and curve
+Min_Move = 20               # go and curve points can't be within +-20 on all axes at once
+Go_Speeds = (10, 100)       # cm/s
+Curve_Speeds = (10, 60)     # cm/s
+Curve_Radius = (50, 1000)   # arc radius
+
+Detour_Height = 50          # climbed and descended again to fly a move shorter than Min_Move
+Collinear_Tolerance = 1.0   # largest distance of a merged waypoint from the straight line
+
+# flight time model for the estimates
+Command_Overhead = 1.0      # seconds to stop, settle and respond after every command
+Yaw_Rate = 60.0             # degrees/second
+
+
+Waypoint = collections.namedtuple('Waypoint', ['x', 'y', 'z', 'heading', 'speed'])
+Waypoint.__new__.__defaults__ = (None, None)
+Waypoint.__doc__ = """
+A point to fly through.
+
+x, y, z are cm forward, left and up from the start position, in the frame of
+the start heading. heading is the yaw in degrees clockwise from the start
+heading to turn to on arrival, None to keep the current one. speed is the cm/s
+for the leg that arrives at the waypoint, None for the plan default.
+"""
+
+
+def body_offset(offset, yaw):
+    """Rotates a start-frame offset into the frame of a drone turned yaw degrees clockwise."""
+    angle = math.radians(yaw)
+    x, y, z = offset
+    return (x * math.cos(angle) - y * math.sin(angle),
+            x * math.sin(angle) + y * math.cos(angle),
+            z)
+
+
+def _subtract(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def _length(v):
+    return math.sqrt(v[0] ** 2 + v[1] ** 2 + v[2] ** 2)
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _valid_point(point):
+    """True if go/curve accepts point as an offset."""
+    return (all(abs(c) <= Go_Range for c in point) and
+            any(abs(c) > Min_Move for c in point))
+
+
+def arc(start, middle, end):
+    """
+    The circular arc from start through middle to end.
+
+    Returns:
+        (float, float): Radius and arc length in cm, or None if the points are collinear
+    """
+    u = _subtract(middle, start)
+    v = _subtract(end, start)
+    w = _subtract(end, middle)
+    area = _length(_cross(u, v)) # twice the triangle area
+    if area < 1e-6:
+        return None
+    radius = _length(u) * _length(v) * _length(w) / (2.0 * area)
+    # the angle at middle is half the arc that does not contain middle
+    cos_middle = _dot(_subtract(start, middle), w) / (_length(u) * _length(w))
+    angle_middle = math.acos(max(-1.0, min(1.0, cos_middle)))
+    return (radius, radius * (2.0 * math.pi - 2.0 * angle_middle))
+
+
+def _clamp_speed(speed, limits):
+    return int(max(limits[0], min(limits[1], round(speed))))
+
+
+def go_commands(offset, speed):
+    """
+    go commands that move by offset, split to respect the SDK limits.
+
+    Offsets beyond Go_Range are split into equal legs. Offsets within Min_Move
+    on every axis are flown as a detour Detour_Height up and back down.
+
+    Parameters:
+        offset (tuple): x, y, z cm in the drone frame
+        speed (float): cm/s
+
+    Returns:
+        list: (command string, distance cm, speed cm/s)
+    """
+    speed = _clamp_speed(speed, Go_Speeds)
+    rounded = tuple(int(round(c)) for c in offset)
+    if not any(rounded):
+        return []
+
+    longest = max(abs(c) for c in rounded)
+    if longest > Go_Range:
+        legs = int(math.ceil(longest / float(Go_Range)))
+        points = [tuple(int(round(c * k / float(legs))) for c in rounded) for k in range(legs + 1)]
+        steps = [_subtract(points[k + 1], points[k]) for k in range(legs)]
+    elif not _valid_point(rounded):
+        steps = [(rounded[0], rounded[1], rounded[2] + Detour_Height), (0, 0, -Detour_Height)]
+    else:
+        steps = [rounded]
+
+    return [('go %d %d %d %d' % (step + (speed,)), _length(step), speed) for step in steps]
+
+
+def turn_command(current, heading):
+    """
+    Returns:
+        (str, float): cw/ccw command and degrees to turn from current to heading, or None
+    """
+    delta = int(round(angle_difference(heading, current)))
+    if delta == 0:
+        return None
+    if delta > 0:
+        return ('cw %d' % delta, float(delta))
+    return ('ccw %d' % -delta, float(-delta))
+
+
+def command_time(distance, speed):
+    """Estimated seconds to fly distance cm at speed cm/s, including the command overhead."""
+    return distance / float(speed) + Command_Overhead
+
+
+class FlightPlan(object):
+    """
+    A compiled trajectory.
+
+    Public Attributes:
+        commands (list): Tello SDK command strings in flight order
+        points (list): Start frame positions the plan flies through, after merging
+        estimated_time (float): Seconds to fly the plan, see Command_Overhead and Yaw_Rate
+        distance (float): cm flown, including detours
+        failed_command (str): The command that failed in execute(), or None
+    """
+
+    def __init__(self, commands, points, estimated_time, distance):
+        self.commands = commands
+        self.points = points
+        self.estimated_time = estimated_time
+        self.distance = distance
+        self.failed_command = None
+
+    @property
+    def command_count(self):
+        return len(self.commands)
+
+    def execute(self, tello):
+        """
+        Flies the plan, stopping at the first command that fails.
+
+        Parameters:
+            tello (Tello): Drone (or simulated drone) to fly, must be flying
+
+        Returns:
+            Bool: True if every command succeeded
+        """
+        self.failed_command = None
+        for command in self.commands:
+            words = command.split(' ')
+            if not getattr(tello, words[0])(*[int(word) for word in words[1:]]):
+                self.failed_command = command
+                return False
+        return True
+
+
+def normalize_waypoints(waypoints):
+    """Converts tuples and dicts to Waypoints."""
+    normalized = []
+    for waypoint in waypoints:
+        if isinstance(waypoint, Waypoint):
+            normalized.append(waypoint)
+        elif isinstance(waypoint, dict):
+            normalized.append(Waypoint(**waypoint))
+        else:
+            normalized.append(Waypoint(*waypoint))
+    return normalized
+
+
+def _merge(points, headings, speeds):
+    """
+    Drops waypoints that lie on the straight line between their neighbours,
+    unless the drone turns or changes speed there.
+    """
+    def on_line(point, start, end):
+        line = _subtract(end, start)
+        offset = _subtract(point, start)
+        if _length(line) == 0 or not 0 <= _dot(offset, line) <= _dot(line, line):
+            return False
+        return _length(_cross(offset, line)) / _length(line) <= Collinear_Tolerance
+
+    keep_points, keep_headings, keep_speeds = [points[0]], [headings[0]], [speeds[0]]
+    dropped = [] # merged since the last kept point, must all stay on the line
+    for i in range(1, len(points)):
+        point = points[i]
+        if i < len(points) - 1 and headings[i] is None and speeds[i] == speeds[i + 1]:
+            start, end = keep_points[-1], points[i + 1]
+            if all(on_line(p, start, end) for p in dropped + [point]):
+                dropped.append(point)
+                continue
+        dropped = []
+        if _length(_subtract(point, keep_points[-1])) < 0.5: # same point, keep the last heading
+            if headings[i] is not None:
+                keep_headings[-1] = headings[i]
+            continue
+        keep_points.append(point)
+        keep_headings.append(headings[i])
+        keep_speeds.append(speeds[i])
+    return keep_points, keep_headings, keep_speeds
+
+
+def plan_trajectory(waypoints, speed=50, merge=True, curves=True, start_heading=0.0):
+    """
+    Compiles waypoints into the shortest Tello command sequence that flies through them.
+
+    Collinear waypoints are merged into one leg, legs are split or detoured to
+    respect the go limits, and where three consecutive points lie on a valid
+    arc (radius 50 - 1000 cm, no turn at the middle point) two legs become one
+    curve. The sequence with the fewest commands is chosen, ties are broken by
+    the estimated flight time.
+
+    Parameters:
+        waypoints (list): Waypoints, or (x, y, z[, heading[, speed]]) tuples or dicts
+        speed (float): Default speed in cm/s. Curves fly at 60 cm/s at most.
+        merge (bool): Merge collinear waypoints
+        curves (bool): Substitute curve commands for pairs of legs
+        start_heading (float): Yaw of the drone at the start, degrees clockwise
+
+    Returns:
+        FlightPlan: The commands, estimated time and distance
+    """
+    waypoints = normalize_waypoints(waypoints)
+    points = [(0.0, 0.0, 0.0)] + [(float(w.x), float(w.y), float(w.z)) for w in waypoints]
+    headings = [None] + [w.heading for w in waypoints]
+    speeds = [speed] + [w.speed if w.speed is not None else speed for w in waypoints]
+    if merge:
+        points, headings, speeds = _merge(points, headings, speeds)
+
+    # yaw of the drone while it leaves each point, and the turn made on arrival
+    yaws, turns = [], []
+    yaw = start_heading
+    for heading in headings:
+        turn = turn_command(yaw, heading) if heading is not None else None
+        if turn is not None:
+            yaw = heading
+        yaws.append(yaw)
+        turns.append(turn)
+
+    def turn_option(j):
+        if turns[j] is None:
+            return ([], 0.0)
+        command, degrees = turns[j]
+        return ([command], degrees / Yaw_Rate + Command_Overhead)
+
+    # best[i] = (command count, time, distance, commands) from point i to the end
+    count = len(points)
+    best = [None] * count
+    best[-1] = (0, 0.0, 0.0, [])
+    for i in range(count - 2, -1, -1):
+        options = []
+
+        legs = go_commands(body_offset(_subtract(points[i + 1], points[i]), yaws[i]), speeds[i + 1])
+        turn, turn_time = turn_option(i + 1)
+        rest = best[i + 1]
+        options.append((len(legs) + len(turn) + rest[0],
+                        sum(command_time(d, s) for _, d, s in legs) + turn_time + rest[1],
+                        sum(d for _, d, _ in legs) + rest[2],
+                        [c for c, _, _ in legs] + turn + rest[3]))
+
+        if curves and i + 2 < count and turns[i + 1] is None:
+            middle = tuple(int(round(c)) for c in body_offset(_subtract(points[i + 1], points[i]), yaws[i]))
+            end = tuple(int(round(c)) for c in body_offset(_subtract(points[i + 2], points[i]), yaws[i]))
+            shape = arc((0, 0, 0), middle, end)
+            if (shape is not None and _valid_point(middle) and _valid_point(end) and
+                    Curve_Radius[0] <= shape[0] <= Curve_Radius[1]):
+                curve_speed = _clamp_speed(min(speeds[i + 1], speeds[i + 2]), Curve_Speeds)
+                turn, turn_time = turn_option(i + 2)
+                rest = best[i + 2]
+                options.append((1 + len(turn) + rest[0],
+                                command_time(shape[1], curve_speed) + turn_time + rest[1],
+                                shape[1] + rest[2],
+                                ['curve %d %d %d %d %d %d %d' % (middle + end + (curve_speed,))] + turn + rest[3]))
+
+        best[i] = min(options, key=lambda option: (option[0], option[1]))
+
+    turn, turn_time = turn_option(0)
+    _, estimated_time, distance, commands = best[0]
+    return FlightPlan(turn + commands, points, estimated_time + turn_time, distance)
@@ -0,0 +1,293 @@
+import traitlets
+from traitlets.config.configurable import SingletonConfigurable
+import atexit
+import collections
+import csv
+import threading
+import time
+import numpy as np
+
+
+Axes = ('lr', 'fb', 'ud', 'yaw') # order of the rc command arguments
+
+
+class PIDController(object):
+    """
+    Discrete PID controller with integral clamping and a filtered derivative.
+    """
+
+    def __init__(self, kp=0.0, ki=0.0, kd=0.0, integral_limit=50.0, derivative_filter=0.5):
+        """
+        Parameters:
+            kp, ki, kd (float): Gains
+            integral_limit (float): Largest magnitude of the integral term's contribution
+            derivative_filter (float): 0 to 1, weight of the newest derivative sample
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.derivative_filter = derivative_filter
+        self.reset()
+
+    def reset(self):
+        self._integral = 0.0
+        self._derivative = 0.0
+        self._last_error = None
+
+    def update(self, error, dt):
+        """Returns the controller output for the error measured dt seconds after the last one."""
+        if dt <= 0:
+            dt = 1e-3
+
+        if self.ki:
+            self._integral += error * dt
+            limit = self.integral_limit / abs(self.ki)
+            self._integral = max(-limit, min(limit, self._integral))
+
+        if self._last_error is not None:
+            derivative = (error - self._last_error) / dt
+            self._derivative += self.derivative_filter * (derivative - self._derivative)
+        self._last_error = error
+
+        return self.kp * error + self.ki * self._integral + self.kd * self._derivative
+
+
+class VisualServoController(SingletonConfigurable):
+    """
+    Keeps a tracked target centered at a fixed distance using the rc command.
+
+    Runs on its own fixed-rate clock, independent of the inference frame rate.
+    MLProcess feeds it the latest target estimate with update_target(); each tick
+    the controller computes PID outputs for all four rc axes, rate limits them
+    and sends them to the Tello. If no fresh target arrives within
+    target_timeout seconds the drone is told to hover.
+
+    The horizontal offset of the target is corrected by yaw alone and lr is held
+    at zero. Feeding the same error to both axes makes them fight over one
+    measurement, and turning keeps the target in view while the drone stays put.
+
+    Traitlets:
+        started (Bool): True while the control loop is running
+        enabled (Bool): Send tracking commands, otherwise stay quiet (after one hover)
+        rate (Float): Control loop rate in Hz
+        gains (Dict): Per axis [kp, ki, kd]. Errors are normalised image units. lr has no error, see above.
+        target_area (Float): Bounding box area (fraction of the image) to hold
+        max_rc (Integer): Largest rc magnitude sent on any axis
+        rate_limit (Float): Largest change of an rc value per second
+        deadband (Float): Errors smaller than this are treated as zero
+        target_timeout (Float): Seconds before a target estimate is stale and the drone hovers
+        log_path (Unicode): If set, every tick is appended to this CSV file for tuning
+    """
+
+    started = traitlets.Bool(default_value=False, read_only=True)
+    enabled = traitlets.Bool(default_value=False)
+
+    rate = traitlets.Float(default_value=20.0).tag(config=True)
+    gains = traitlets.Dict(default_value={'lr': [0.0, 0.0, 0.0],
+                                          'fb': [120.0, 5.0, 0.0],
+                                          'ud': [60.0, 5.0, 5.0],
+                                          'yaw': [80.0, 0.0, 8.0]}).tag(config=True)
+    target_area = traitlets.Float(default_value=0.12).tag(config=True)
+    max_rc = traitlets.Integer(default_value=40).tag(config=True)
+    rate_limit = traitlets.Float(default_value=150.0).tag(config=True)
+    deadband = traitlets.Float(default_value=0.02).tag(config=True)
+    target_timeout = traitlets.Float(default_value=0.5).tag(config=True)
+    log_path = traitlets.Unicode(default_value='').tag(config=True)
+
+    def __init__(self, tello=None, *args, **kwargs):
+        """
+        Parameters:
+            tello (Tello): Drone that receives the rc commands
+        """
+        super(VisualServoController, self).__init__(*args, **kwargs) # Get an instance of the SingtonConfigurable and call its init
+
+        self.set_trait('started', False)
+
+        # private members
+        self._tello = tello
+        self._thread = None
+        self._lock = threading.Lock()
+        self._target = None
+        self._pids = {axis: PIDController() for axis in Axes}
+        self._apply_gains()
+        self._output = dict.fromkeys(Axes, 0.0)
+        self._hovering = True
+        self._periods = collections.deque(maxlen=500)
+        self._overruns = 0
+        self._failsafes = 0
+        self._samples = collections.deque(maxlen=2000)
+        self._step_start = None
+
+        atexit.register(self.stop)
+
+    @traitlets.observe('gains')
+    def _gains_changed(self, change):
+        if hasattr(self, '_pids'):
+            self._apply_gains()
+
+    def _apply_gains(self):
+        for axis, (kp, ki, kd) in self.gains.items():
+            pid = self._pids[axis]
+            pid.kp, pid.ki, pid.kd = kp, ki, kd
+
+    def start(self):
+        if not self.started:
+            self.set_trait('started', True)
+            self._thread = threading.Thread(target=self._control, args=(), name='visual-servo')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self.started:
+            self.set_trait('started', False)
+            self._thread.join()
+            self._hover()
+
+    def update_target(self, center_x, center_y, area, timestamp=None):
+        """
+        Publishes the newest target estimate.
+
+        Parameters:
+            center_x, center_y (float): Target center relative to the image center (-0.5 to 0.5)
+            area (float): Bounding box area as a fraction of the image
+            timestamp (float): time.monotonic() of the frame the target was seen in
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self._lock:
+            self._target = (center_x, center_y, area, timestamp)
+
+    def clear_target(self):
+        with self._lock:
+            self._target = None
+
+    def loop_metrics(self):
+        """
+        Returns:
+            dict: rate_hz - measured loop rate
+                  period_ms - mean, p95 and max loop period
+                  overruns - ticks that started late by more than a full period
+                  failsafes - times the stale target timeout forced a hover
+        """
+        periods = np.array(self._periods) * 1000.0
+        metrics = dict(rate_hz=None, period_ms=None, overruns=self._overruns, failsafes=self._failsafes)
+        if len(periods):
+            metrics['rate_hz'] = 1000.0 / float(np.mean(periods))
+            metrics['period_ms'] = dict(mean=float(np.mean(periods)),
+                                        p95=float(np.percentile(periods, 95)),
+                                        max=float(np.max(periods)))
+        return metrics
+
+    def step_response(self, settle_band=0.1):
+        """
+        Characterises the response since the target was last (re)acquired.
+
+        Parameters:
+            settle_band (float): Fraction of the initial error counted as settled
+
+        Returns:
+            dict: Per axis initial_error, rise_time (s to reach 10% of the initial
+                  error), overshoot (fraction of the initial error crossed past zero)
+                  and settling_time (s until the error stays inside settle_band)
+        """
+        if self._step_start is None:
+            return {}
+        samples = [s for s in self._samples if s[0] >= self._step_start]
+        if not samples:
+            return {}
+
+        t0 = samples[0][0]
+        response = {}
+        for i, axis in enumerate(Axes):
+            errors = [s[1][i] for s in samples]
+            e0 = errors[0]
+            result = dict(initial_error=e0, rise_time=None, overshoot=0.0, settling_time=None)
+            if abs(e0) > self.deadband:
+                for t, e in zip((s[0] for s in samples), errors):
+                    if result['rise_time'] is None and abs(e) <= 0.1 * abs(e0):
+                        result['rise_time'] = t - t0
+                    if e * e0 < 0:
+                        result['overshoot'] = max(result['overshoot'], abs(e) / abs(e0))
+                band = max(settle_band * abs(e0), self.deadband)
+                outside = [s[0] for s, e in zip(samples, errors) if abs(e) > band]
+                if not outside:
+                    result['settling_time'] = 0.0
+                elif outside[-1] < samples[-1][0]:
+                    result['settling_time'] = outside[-1] - t0
+            response[axis] = result
+        return response
+
+    def _errors(self, target):
+        center_x, center_y, area, timestamp = target
+        errors = (0.0,                                                  # lr: centering is left to yaw
+                  np.sqrt(self.target_area) - np.sqrt(max(area, 0.0)),   # fb: sqrt(area) ~ inverse distance
+                  -center_y,                                            # ud: image y grows downward
+                  center_x)                                             # yaw: turn toward the target
+        return tuple(0.0 if abs(e) < self.deadband else e for e in errors)
+
+    def _hover(self):
+        for axis in Axes:
+            self._pids[axis].reset()
+            self._output[axis] = 0.0
+        if not self._hovering and self._tello is not None:
+            self._tello.rc(0, 0, 0, 0)
+        self._hovering = True
+
+    def _tick(self, now, dt):
+        with self._lock:
+            target = self._target
+
+        if not self.enabled:
+            self._hover()
+            return
+
+        if target is None or now - target[3] > self.target_timeout:
+            if not self._hovering:
+                self._failsafes += 1
+            self._hover()
+            return
+
+        if self._hovering:
+            self._step_start = now # target (re)acquired, a new step response starts
+
+        errors = self._errors(target)
+        max_step = self.rate_limit * dt
+        for axis, error in zip(Axes, errors):
+            output = self._pids[axis].update(error, dt)
+            previous = self._output[axis]
+            output = max(previous - max_step, min(previous + max_step, output))
+            self._output[axis] = max(-self.max_rc, min(self.max_rc, output))
+
+        command = [int(round(self._output[axis])) for axis in Axes]
+        if self._tello is not None:
+            self._tello.rc(*command)
+        self._hovering = False
+        self._samples.append((now, errors, command))
+        self._log(now, errors, command)
+
+    def _log(self, now, errors, command):
+        if self.log_path:
+            with open(self.log_path, 'a', newline='') as f:
+                csv.writer(f).writerow(['%.4f' % now] + ['%.4f' % e for e in errors] + command)
+
+    def _control(self):
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        last_time = next_time - period
+        while self.started:
+            now = time.monotonic()
+            dt = now - last_time
+            self._periods.append(dt)
+            last_time = now
+
+            self._tick(now, dt)
+
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                if -delay > period:
+                    self._overruns += 1
+                next_time = time.monotonic()